@@ -1,19 +1,24 @@
+from typing import TYPE_CHECKING
 from crewai import Agent,LLM
 from tools.webscraping_tool import WebScraper
 from tools.websearch_tool import Web_search
-from langchain_core.language_models.chat_models import BaseChatModel
+
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
 
 
 class CityPannerAgent:
-    def __init__(self,llm: BaseChatModel = None):
+    def __init__(self,llm: "BaseChatModel" = None, tools: list = None):
         
         if llm is None:
             #self.llm = LLM(model="groq/deepseek-r1-distill-llama-70b")
             self.llm = LLM(model="gemini/gemini-2.0-flash")
         else:
             self.llm = llm
-        self.web_search_tool = WebScraper()
-        self.web_scraper_tool = Web_search()
+        # Shared tool instances can be passed in to avoid building new ones per run
+        if tools is None:
+            tools = [WebScraper(), Web_search()]
+        self.web_search_tool, self.web_scraper_tool = tools
 
     def create_agent(self):
         try:
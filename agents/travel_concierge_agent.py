@@ -1,19 +1,23 @@
+from typing import TYPE_CHECKING
 from crewai import Agent,LLM
 from tools.webscraping_tool import WebScraper
 from tools.websearch_tool import Web_search
 from tools.calculator_tool import CalculatorTools
-from langchain_core.language_models.chat_models import BaseChatModel
+
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
 
 class TravelConciergeAgent:
-    def __init__(self,llm: BaseChatModel = None):
+    def __init__(self,llm: "BaseChatModel" = None, tools: list = None):
         if llm is None:
             #self.llm = LLM(model="groq/deepseek-r1-distill-llama-70b")
             self.llm = LLM(model="gemini/gemini-2.0-flash")
         else:
             self.llm = llm
-        self.web_search_tool = WebScraper()
-        self.web_scraper_tool = Web_search()
-        self.calculator_tool=CalculatorTools()
+        # Shared tool instances can be passed in to avoid building new ones per run
+        if tools is None:
+            tools = [WebScraper(), Web_search(), CalculatorTools()]
+        self.web_search_tool, self.web_scraper_tool, self.calculator_tool = tools
 
     def create_agent(self):
         try:
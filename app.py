@@ -1,10 +1,13 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, Field
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+from dotenv import load_dotenv
 import os
 import re
+import threading
 
 # Assuming 'main' module and 'TripCrew' class exist in main.py
 # Make sure your main.py file is in the same directory as this file.
@@ -12,7 +15,15 @@ import re
 # must be updated to accept the gemini_model and API keys as arguments
 # and load them from os.environ or directly use the passed arguments
 # for the LLM initialization within TripCrew.
-from main import TripCrew # Ensure TripCrew in main.py can accept/use environment variables set here.
+from main import STAGES, TripCrew, plan_trip # Ensure TripCrew in main.py can accept/use environment variables set here.
+from batch import BatchPlanner
+from jobs import JobQueue, QueueFullError
+from worker_pool import CrewProcessPool
+from tools.rate_limit import limiter_stats
+from plan_cache import PlanCache
+from prewarm import Prewarmer
+import metrics
+from events import CrewProgress, ProgressEmitter, bind, emit, install_llm_stream_listener
 
 # Define the input schema for the main trip planning API endpoint
 class InputSchema(BaseModel):
@@ -21,6 +32,10 @@ class InputSchema(BaseModel):
     cities: str = Field(..., description="The cities to consider for the trip, e.g. 'paris,london,berlin,japan'")
     date_range: str = Field(..., description="The date range for the data to be fetched, e.g. '2023-01-01 to 2023-12-31'")
 
+# Define the input schema for the batch trip planning endpoint
+class BatchInputSchema(BaseModel):
+    items: list[InputSchema] = Field(..., description="The trips to plan, e.g. one per traveller of a group or campaign")
+
 # Define the input schema for the /config endpoint
 class ConfigInputSchema(BaseModel):
     gemini_model: str = Field(..., description="The Gemini model to use, e.g., 'gemini-2.0-flash'")
@@ -29,11 +44,134 @@ class ConfigInputSchema(BaseModel):
     serper_api_key: str = Field(..., description="Your Serper API Key")
 
 
+def clean_markdown(output) -> str:
+    """Convert the crew's markdown output to plain text for a cleaner JSON response."""
+    # Convert the output to string if it's not already
+    if not isinstance(output, str):
+        output = str(output)
+
+    output = output.replace('#', '') # Remove markdown headers
+    output = output.replace('**', '').replace('*', '') # Remove markdown bold/italic markers
+    output = output.replace('- ', '• ') # Convert markdown list markers to bullet points
+    output = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', output) # Remove markdown links (keep text)
+    output = re.sub(r'\n\s*\n', '\n\n', output) # Normalize multiple newlines
+    return output.strip() # Remove leading/trailing whitespace
+
+
+def check_configured():
+    """Raise a 400 unless the API keys and Gemini model have been configured."""
+    if not all([
+        os.getenv("GEMINI_MODEL"),
+        os.getenv("GEMINI_API_KEY"),
+        os.getenv("BROWSERLESS_API_KEY"),
+        os.getenv("SERPER_API_KEY"),
+    ]):
+        raise HTTPException(
+            status_code=400,
+            detail="API keys and Gemini model are not configured. Please POST to /config first."
+        )
+
+
+plan_cache = PlanCache()
+prewarmer = Prewarmer()
+
+# With CREW_EXECUTION=process the sync endpoint and the job queue run crews in
+# a pool of worker processes, one crew per CPU core by default. Streamed and
+# batch runs report progress from inside the crew and stay in this process.
+crew_pool = None
+if os.getenv("CREW_EXECUTION", "thread").lower() == "process":
+    crew_pool = CrewProcessPool("main:plan_trip", preload="main:preload")
+
+
+def run_trip_plan(inputs: dict, progress: CrewProgress = None) -> dict:
+    """
+    Return the cleaned trip plan for one request and how each stage was obtained.
+
+    Identical requests (after normalization) are answered from the plan cache,
+    or share the crew run of a request that is already in flight. Otherwise
+    the crew re-runs only the stages whose inputs changed since an earlier
+    request, and ``stages`` tells which ones ran and which were reused.
+    """
+    stages = {}
+
+    def run():
+        if progress is not None:
+            crew = TripCrew(
+                origin=inputs["origin"],
+                cities=inputs["cities"],
+                interests=inputs["interests"],
+                date_range=inputs["date_range"],
+                stream=True,
+            )
+            output = crew.run_crew(step_callback=progress.step_callback, task_callback=progress.task_callback)
+            stages.update(crew.stage_report)
+            return clean_markdown(output)
+        result = crew_pool.run(inputs) if crew_pool is not None else plan_trip(inputs)
+        stages.update(result["stages"])
+        return clean_markdown(result["trip_plan"])
+
+    prewarmer.record_request(inputs)
+    plan, source = plan_cache.get_or_run(inputs, run)
+    if source != "miss":
+        stages = {stage: "reused" for stage in STAGES}
+    else:
+        prewarmer.record_live(stages)
+    emit("plan_cache", status=source)
+    return {"trip_plan": plan, "stages": stages}
+
+
+job_queue = JobQueue(
+    run_trip_plan,
+    # Every worker process gets a queue thread to feed it.
+    workers=crew_pool.workers if crew_pool is not None else int(os.getenv("CREW_WORKERS", 2)),
+    max_queue=int(os.getenv("CREW_MAX_QUEUE", 20)),
+)
+
+
+def warmup():
+    from registry import get_registry
+
+    print(f"Registry warmed up in {get_registry().warmup():.2f}s")
+
+
+QUEUE_DEPTH = metrics.gauge("tour_planner_job_queue_depth", "Jobs waiting in the queue and jobs running")
+
+
+def collect_queue_depth():
+    stats = job_queue.stats()
+    QUEUE_DEPTH.set(stats["queued"], state="queued")
+    QUEUE_DEPTH.set(stats["running"], state="running")
+
+
+metrics.register_collector(collect_queue_depth)
+if crew_pool is not None:
+    metrics.register_collector(crew_pool.stats)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_dotenv()
+    # Build the LLM clients, tools and agent templates in the background so the
+    # server starts accepting requests without waiting for crewAI to import.
+    threading.Thread(target=warmup, name="registry-warmup", daemon=True).start()
+    if crew_pool is not None:
+        crew_pool.start()
+    job_queue.start()
+    if os.getenv("PREWARM_ENABLED", "false").lower() == "true":
+        prewarmer.start()
+    yield
+    prewarmer.stop()
+    job_queue.stop(timeout=5)
+    if crew_pool is not None:
+        crew_pool.stop(timeout=10)
+
+
 # Initialize the FastAPI application
 app = FastAPI(
     title="CrewAI Tourist Assistant API",
     description="API to plan trips using CrewAI agents and external tools.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS (useful if a separate frontend will consume this API)
@@ -62,6 +200,61 @@ async def check_config_status():
     return JSONResponse(content={"configured": configured}, status_code=200)
 
 
+# Prometheus metrics endpoint
+@app.get("/metrics")
+def get_metrics():
+    """
+    Exposes latency histograms, token usage, cache hits and misses, error counts
+    and job queue depth in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# Recent trace spans
+@app.get("/traces")
+def get_traces(limit: int = 100):
+    """
+    Returns the most recent spans (crew kickoff, tasks, tools, LLM and HTTP calls)
+    with their trace id, parent span and duration.
+    """
+    return JSONResponse(content={"spans": list(metrics.recent_spans)[-limit:]}, status_code=200)
+
+
+# Crew worker processes
+@app.get("/workers")
+def get_workers():
+    """
+    Returns the memory, job counts, throughput and recycling of every crew worker
+    process when CREW_EXECUTION=process, and the rate limiters of the API process
+    with the request budget they share with the workers.
+    """
+    if crew_pool is None:
+        return JSONResponse(content={"execution": "thread", "workers": [], "rate_limits": limiter_stats()}, status_code=200)
+    return JSONResponse(content={"execution": "process", **crew_pool.stats(), "rate_limits": limiter_stats()}, status_code=200)
+
+
+# Prewarming of popular destinations
+@app.get("/prewarm")
+def get_prewarm():
+    """
+    Returns the prewarm targets, budget, the last run and the share of live city
+    research and guide stages that were served from prewarmed outputs.
+    """
+    return JSONResponse(content=prewarmer.report(), status_code=200)
+
+
+@app.post("/prewarm", status_code=202)
+def start_prewarm():
+    """
+    Starts a prewarm run now, outside the off-peak window. Answers 409 while a run is in progress.
+    """
+    check_configured()
+    if prewarmer.running:
+        raise HTTPException(status_code=409, detail="A prewarm run is already in progress.")
+    threading.Thread(target=prewarmer.run, kwargs={"force": True}, name="prewarm-run", daemon=True).start()
+    return JSONResponse(content={"status": "started"}, status_code=202)
+
+
 # POST endpoint for configuration
 @app.post('/config')
 def set_configuration(config_data: ConfigInputSchema):
@@ -85,6 +278,10 @@ def set_configuration(config_data: ConfigInputSchema):
             f.write(f"BROWSERLESS_API_KEY=\"{config_data.browserless_api_key}\"\n")
             f.write(f"SERPER_API_KEY=\"{config_data.serper_api_key}\"\n")
 
+        # Worker processes only see the environment they were started with.
+        if crew_pool is not None:
+            crew_pool.recycle()
+
         return JSONResponse(content={"message": f"Configuration updated and saved to {env_file_path} successfully!"}, status_code=200)
     except Exception as e:
         # Log the error if saving to .env fails, but still raise HTTPException
@@ -107,46 +304,15 @@ def planner(input_data: InputSchema):
                 detail="All fields (origin, cities, interests, date_range) are required."
             )
 
-        # Retrieve API keys and model from environment variables
-        gemini_model = os.getenv("GEMINI_MODEL")
-        gemini_api_key = os.getenv("GEMINI_API_KEY")
-        browserless_api_key = os.getenv("BROWSERLESS_API_KEY")
-        serper_api_key = os.getenv("SERPER_API_KEY")
-
         # Validate that all necessary environment variables are set
-        if not all([gemini_model, gemini_api_key, browserless_api_key, serper_api_key]):
-            raise HTTPException(
-                status_code=400,
-                detail="API keys and Gemini model are not configured. Please POST to /config first."
-            )
+        check_configured()
 
         try:
-            # Instantiate TripCrew with all necessary parameters
             # IMPORTANT: TripCrew in main.py MUST be able to read these env vars or accept them directly.
-            crew = TripCrew(
-                origin=input_data.origin,
-                cities=input_data.cities,
-                interests=input_data.interests,
-                date_range=input_data.date_range,
-            )
-
-            # Run the crew to get the output
-            output = crew.run_crew()
-
-            # Convert the output to string if it's not already
-            if not isinstance(output, str):
-                output = str(output)
-
-            # Convert markdown to plain text for a cleaner JSON response
-            output = output.replace('#', '') # Remove markdown headers
-            output = output.replace('**', '').replace('*', '') # Remove markdown bold/italic markers
-            output = output.replace('- ', '• ') # Convert markdown list markers to bullet points
-            output = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', output) # Remove markdown links (keep text)
-            output = re.sub(r'\n\s*\n', '\n\n', output) # Normalize multiple newlines
-            output = output.strip() # Remove leading/trailing whitespace
+            output = run_trip_plan(input_data.model_dump())
 
             # Return the output as a JSON response
-            return JSONResponse(content={"trip_plan": output}, status_code=200)
+            return JSONResponse(content=output, status_code=200)
 
         except Exception as e:
             print(f"An error occurred during trip planning: {e}") # Log the error for debugging
@@ -166,5 +332,102 @@ def planner(input_data: InputSchema):
         )
 
 
+# POST endpoint streaming the progress of a trip plan as Server-Sent Events
+@app.post('/tourist_assistant/stream')
+def stream_planner(input_data: InputSchema):
+    """
+    Runs the crew and streams its progress as Server-Sent Events: task start and
+    finish with each task's output, agent steps, tool calls with their latency,
+    streamed LLM tokens, then a final `result` (or `error`) event.
+    """
+    check_configured()
+    install_llm_stream_listener()
+    emitter = ProgressEmitter()
+    inputs = input_data.model_dump()
+
+    def run():
+        with bind(emitter):
+            try:
+                emit("crew_started", inputs=inputs)
+                progress = CrewProgress(STAGES)
+                progress.started()
+                emit("result", **run_trip_plan(inputs, progress))
+            except Exception as e:
+                print(f"An error occurred during streamed trip planning: {e}")
+                emit("error", detail=str(e))
+            finally:
+                emitter.close()
+
+    threading.Thread(target=run, name="crew-stream", daemon=True).start()
+    return StreamingResponse(
+        emitter.sse(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# POST endpoint planning many trips at once, streaming each result as it is ready
+@app.post('/tourist_assistant/batch')
+def batch_planner(batch: BatchInputSchema):
+    """
+    Plans a batch of trips. Items with the same cities and dates share one run of
+    the city research and guide, flight costs are looked up once per origin, and
+    the planner and concierge run per item.
+    Streams an `item_result` (or `item_error`) Server-Sent Event per item as soon
+    as it is ready, then a `batch_report` with the LLM and search calls saved.
+    """
+    check_configured()
+    max_items = int(os.getenv("BATCH_MAX_ITEMS", 100))
+    if not batch.items or len(batch.items) > max_items:
+        raise HTTPException(status_code=400, detail=f"A batch must have between 1 and {max_items} items.")
+    emitter = ProgressEmitter()
+    items = [item.model_dump() for item in batch.items]
+
+    def run():
+        with bind(emitter):
+            try:
+                BatchPlanner(clean=clean_markdown).run(items)
+            except Exception as e:
+                print(f"An error occurred during batch trip planning: {e}")
+                emit("error", detail=str(e))
+            finally:
+                emitter.close()
+
+    threading.Thread(target=run, name="crew-batch", daemon=True).start()
+    return StreamingResponse(
+        emitter.sse(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# POST endpoint to queue a trip planning job
+@app.post('/tourist_assistant/jobs', status_code=202)
+def submit_job(input_data: InputSchema):
+    """
+    Queues a trip planning job and returns its id immediately.
+    Poll GET /tourist_assistant/jobs/{job_id} for the status and the trip plan.
+    Answers 429 when the job queue is full.
+    """
+    check_configured()
+    try:
+        job_id = job_queue.submit(input_data.model_dump())
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JSONResponse(content={"job_id": job_id, "status": "queued"}, status_code=202)
+
+
+# GET endpoint for the status of a queued job
+@app.get('/tourist_assistant/jobs/{job_id}')
+def get_job(job_id: str):
+    """
+    Returns the status of a job, its queue-wait and run time, and the trip plan once it is done.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return JSONResponse(content=job, status_code=200)
+
+
 if __name__=="__main__":
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""
+Plan many trips at once, sharing the destination work between them.
+
+Items with the same candidate cities and dates form a group, and groups are
+planned at the same time. All travellers of a group share one research of
+every candidate city (weather, events, daily cost and attractions, for the
+union of their interests) and one guide of every chosen city; only the
+flight costs are looked up once per origin. The planner and the concierge
+run for every traveller with their own origin and interests, so neither
+sees another traveller's request.
+"""
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from events import EventCounter, bind, emit
+from plan_cache import normalize_list
+
+
+def group_key(inputs: dict) -> tuple:
+    return tuple(normalize_list(inputs["cities"])), " ".join(inputs["date_range"].lower().split())
+
+
+def group_items(items: list) -> dict:
+    """Indices of the items of every destination group, groups in order of first appearance."""
+    groups = {}
+    for index, item in enumerate(items):
+        groups.setdefault(group_key(item), []).append(index)
+    return groups
+
+
+def origin_key(origin: str) -> str:
+    return " ".join(origin.lower().split())
+
+
+def merge_values(values) -> str:
+    """Union of comma separated values, in order of first appearance."""
+    merged = {}
+    for value in values:
+        for item in value.split(","):
+            item = item.strip()
+            if item:
+                merged.setdefault(item.lower(), item)
+    return ", ".join(merged.values())
+
+
+class SharedStages:
+    """
+    Run every shared stage of a group once and hand its output to each item.
+
+    The first item that needs a stage runs it while the others wait for its
+    result, or its error. The upstream calls of every stage are counted so
+    the report can tell how many calls the sharing saved.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def get(self, key, run) -> tuple:
+        """The output of ``run()`` for ``key``, and whether this caller was the one that ran it."""
+        with self._lock:
+            stage = self._stages.get(key)
+            owner = stage is None
+            if owner:
+                stage = self._stages[key] = {"future": Future(), "counter": EventCounter(), "users": 0}
+            stage["users"] += 1
+        if owner:
+            try:
+                with bind(stage["counter"]):
+                    stage["future"].set_result(run())
+            except Exception as e:
+                stage["future"].set_exception(e)
+        return stage["future"].result(), owner
+
+    def calls(self, event: str) -> tuple:
+        """Calls of ``event`` the shared stages made, and those they saved the other users."""
+        with self._lock:
+            stages = list(self._stages.values())
+        shared = sum(stage["counter"].counts[event] for stage in stages)
+        saved = sum(stage["counter"].counts[event] * (stage["users"] - 1) for stage in stages)
+        return shared, saved
+
+
+class BatchPlanner:
+    """
+    Run a batch of trip requests and emit one ``item_result`` (or
+    ``item_error``) event per item as soon as it is ready, then a
+    ``batch_report`` with the LLM and search calls the shared stages saved.
+
+    Args:
+        clean: Applied to every trip plan, e.g. to strip markdown.
+        max_workers (int): Items of one group planned at the same time.
+        max_groups (int): Groups planned at the same time.
+    """
+
+    def __init__(self, clean=str, max_workers: int = None, max_groups: int = None):
+        self.clean = clean
+        self.max_workers = max_workers or int(os.getenv("BATCH_CONCIERGE_CONCURRENCY", 4))
+        self.max_groups = max_groups or int(os.getenv("BATCH_GROUP_CONCURRENCY", 2))
+
+    def run(self, items: list) -> dict:
+        groups = group_items(items)
+        emit("batch_started", items=len(items), groups=len(groups))
+        report = {"items": len(items), "failed": 0, "saved_llm_calls": 0, "saved_search_requests": 0, "groups": []}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_groups, len(groups)))) as pool:
+            # A copy of the context per group, so its events reach the caller's stream.
+            futures = [pool.submit(contextvars.copy_context().run, self.run_group, items, indices) for indices in groups.values()]
+        for future in futures:
+            group = future.result()
+            report["failed"] += group["failed"]
+            report["saved_llm_calls"] += group["saved_llm_calls"]
+            report["saved_search_requests"] += group["saved_search_requests"]
+            report["groups"].append(group)
+        emit("batch_report", **report)
+        return report
+
+    def run_group(self, items: list, indices: list) -> dict:
+        members = [items[i] for i in indices]
+        report = {
+            "cities": members[0]["cities"],
+            "date_range": members[0]["date_range"],
+            "items": indices,
+            "failed": 0,
+        }
+        emit("group_started", cities=report["cities"], date_range=report["date_range"], items=indices)
+
+        interests = merge_values(m["interests"] for m in members)
+        shared = SharedStages()
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(indices)))) as pool:
+            futures = {
+                pool.submit(contextvars.copy_context().run, self.plan_item, items[i], interests, shared): i
+                for i in indices
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    plan, stages = future.result()
+                except Exception as e:
+                    print(f"Batch item {index} failed: {e}")
+                    report["failed"] += 1
+                    emit("item_error", index=index, detail=str(e))
+                    continue
+                emit("item_result", index=index, trip_plan=plan, stages=stages)
+
+        # Each traveller would otherwise have run the shared stages on their own.
+        report["shared_llm_calls"], report["saved_llm_calls"] = shared.calls("llm_call")
+        report["shared_search_requests"], report["saved_search_requests"] = shared.calls("search_request")
+        emit("group_finished", cities=report["cities"], date_range=report["date_range"], failed=report["failed"])
+        return report
+
+    def plan_item(self, item: dict, interests: str, shared: SharedStages) -> tuple:
+        from main import TripCrew
+        from tasks.handoff import CityChoice, structured
+
+        def group_crew(origin: str = ""):
+            # Without an origin the crew's research and guide fit every traveller of the group.
+            return TripCrew(origin=origin, cities=item["cities"], interests=interests, date_range=item["date_range"])
+
+        def research(stage: str, origin: str = ""):
+            def run():
+                research_crew = group_crew(origin)
+                method = research_crew.flight_cost if stage == "flight_cost" else research_crew.research_destination
+                return research_crew.research_cities(research_crew.city_list(), method), research_crew.stage_report.get(stage, {})
+            return run
+
+        def guide(choice):
+            def run():
+                guide_crew = group_crew()
+                return guide_crew.city_guide(choice), guide_crew.stage_report.get("guide")
+            return run
+
+        def outcome(report, owner: bool):
+            """How the stage was obtained by the item that ran it, ``shared`` for the items that reused its output."""
+            if owner:
+                return report
+            return {city: "shared" for city in report} if isinstance(report, dict) else "shared"
+
+        crew = TripCrew(
+            origin=item["origin"],
+            cities=item["cities"],
+            interests=item["interests"],
+            date_range=item["date_range"],
+        )
+        stages = {}
+        # The item's own progress events are not part of the batch stream.
+        with bind(EventCounter()):
+            (destinations, report), owner = shared.get(("destination_research",), research("destination_research"))
+            stages["destination_research"] = outcome(report, owner)
+            (flights, report), owner = shared.get(("flight_cost", origin_key(item["origin"])), research("flight_cost", item["origin"]))
+            stages["flight_cost"] = outcome(report, owner)
+            summaries = {
+                city: f"{summary}\nFlight cost from {item['origin']}: {flights.get(city, 'unknown')}"
+                for city, summary in destinations.items()
+            }
+            choice = crew.plan_city(summaries=summaries)
+            chosen = structured(choice, CityChoice)
+            city = chosen.chosen_city if chosen is not None else getattr(choice, "raw", str(choice))
+            (guide_output, report), owner = shared.get(("guide", " ".join(city.lower().split())), guide(choice))
+            stages["guide"] = outcome(report, owner)
+            output = crew.concierge_plan(choice, guide_output)
+        return self.clean(output), {**crew.stage_report, **stages}
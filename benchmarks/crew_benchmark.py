@@ -0,0 +1,155 @@
+"""
+End-to-end benchmark of TripCrew on a set of canonical trips.
+
+No fixtures are committed, since they hold full Gemini, Serper and
+Browserless responses. Record them once against the live services (needs
+GEMINI_API_KEY, SERPER_API_KEY and BROWSERLESS_API_KEY):
+
+    python -m benchmarks.crew_benchmark --record
+
+then replay them on any machine, without network access:
+
+    python -m benchmarks.crew_benchmark --latency-scale 1.0 --repeat 3
+
+Reports end-to-end latency, time per task and per tool, LLM call and token
+counts, and the prompt tokens each task saves through the compacted hand-off
+for every trip.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Start from empty caches so every run does the same work.
+os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="crew-benchmark-")
+# Telemetry is the one upstream call that does not go through the cassette.
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from benchmarks.replay import Cassette  # noqa: E402
+from events import CrewProgress, ProgressEmitter, bind  # noqa: E402
+from main import STAGES, TripCrew  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+TRIPS = {
+    "bangalore-europe": {
+        "origin": "Bangalore",
+        "cities": "paris,london,berlin",
+        "interests": "food,history,art,museums",
+        "date_range": "2025-06-01 to 2025-06-10",
+    },
+    "delhi-japan": {
+        "origin": "Delhi",
+        "cities": "tokyo,kyoto",
+        "interests": "food,temples,hiking",
+        "date_range": "2025-04-01 to 2025-04-07",
+    },
+    "mumbai-single-city": {
+        "origin": "Mumbai",
+        "cities": "lisbon",
+        "interests": "beaches,watersports,nightlife",
+        "date_range": "2025-09-10 to 2025-09-15",
+    },
+}
+
+
+def reset_caches():
+    from stage_cache import get_stage_cache
+    from tools.llm_cache import get_llm_cache
+    from tools.websearch_tool import get_search_cache
+
+    get_search_cache().clear()
+    get_llm_cache().clear()
+    get_stage_cache().clear()
+
+
+def run_trip(name: str, inputs: dict, mode: str, latency_scale: float) -> dict:
+    reset_caches()
+    cassette = Cassette(os.path.join(FIXTURE_DIR, f"{name}.json"), mode=mode, latency_scale=latency_scale)
+    emitter = ProgressEmitter()
+    progress = CrewProgress(STAGES)
+
+    start = time.perf_counter()
+    with cassette, bind(emitter):
+        progress.started()
+        crew = TripCrew(**inputs)
+        crew.run_crew(step_callback=progress.step_callback, task_callback=progress.task_callback)
+    total = time.perf_counter() - start
+    emitter.close()
+
+    task_time, task_started, tool_time, tool_calls = {}, {}, defaultdict(float), defaultdict(int)
+    for event, data in emitter:
+        if event == "task_started":
+            task_started[data["stage"]] = data["elapsed_s"]
+        elif event == "task_finished":
+            task_time[data["stage"]] = data["elapsed_s"] - task_started.get(data["stage"], 0.0)
+        elif event == "tool_finished":
+            tool_time[data["tool"]] += data["latency_s"]
+            tool_calls[data["tool"]] += 1
+
+    return {
+        "total_s": total,
+        "task_s": task_time,
+        "tool_s": dict(tool_time),
+        "tool_calls": dict(tool_calls),
+        "llm_calls": cassette.calls["llm"],
+        "http_calls": {kind: n for kind, n in cassette.calls.items() if kind != "llm"},
+        "prompt_tokens": cassette.tokens["prompt_tokens"],
+        "completion_tokens": cassette.tokens["completion_tokens"],
+        "handoff_tokens": getattr(crew, "handoff_report", {}),
+    }
+
+
+def print_report(name: str, runs: list):
+    totals = [run["total_s"] for run in runs]
+    last = runs[-1]
+    print(f"\n== {name} ({len(runs)} run{'s' if len(runs) > 1 else ''})")
+    print(f"end-to-end   mean {statistics.mean(totals):.2f}s  min {min(totals):.2f}s  max {max(totals):.2f}s")
+    for stage in STAGES:
+        if stage in last["task_s"]:
+            print(f"task {stage:<12}{last['task_s'][stage]:>8.2f}s")
+    for tool, seconds in sorted(last["tool_s"].items()):
+        print(f"tool {tool:<28}{seconds:>8.2f}s over {last['tool_calls'][tool]} calls")
+    print(f"LLM calls {last['llm_calls']}, prompt tokens {last['prompt_tokens']}, completion tokens {last['completion_tokens']}")
+    print(f"HTTP calls {last['http_calls']}")
+    for stage, tokens in last["handoff_tokens"].items():
+        print(f"prompt tokens {stage:<12}{tokens['before']:>8} full context -> {tokens['after']:>6} compacted")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", action="store_true", help="Call the live services and (re)write the fixtures")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for recorded latencies in replay")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--trip", action="append", choices=sorted(TRIPS), help="Only run these trips")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    mode = "record" if args.record else "replay"
+    trips = args.trip or list(TRIPS)
+    if mode == "replay":
+        missing = [name for name in trips if not os.path.exists(os.path.join(FIXTURE_DIR, f"{name}.json"))]
+        if missing:
+            parser.error(f"no fixtures for {', '.join(missing)} in {FIXTURE_DIR}, record them first with --record")
+        # Replayed calls never reach the upstreams, and waiting on their rate
+        # limiters would only add the limiter's pacing to the timings.
+        os.environ["RATE_LIMIT_ENABLED"] = "false"
+    results = {}
+    for name in trips:
+        runs = [run_trip(name, TRIPS[name], mode, args.latency_scale) for _ in range(1 if args.record else args.repeat)]
+        results[name] = runs
+        print_report(name, runs)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
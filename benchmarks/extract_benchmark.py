@@ -0,0 +1,98 @@
+"""
+Compare the HTML extraction backends used by the web scraper.
+
+Runs every available backend over a directory of saved travel pages and
+reports throughput, peak Python memory and how much of the reference text
+(the ``unstructured`` output when it is installed) each backend recovers.
+
+    python -m benchmarks.extract_benchmark path/to/saved_pages --repeat 3
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.html_extract import BACKENDS  # noqa: E402
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def load_corpus(path):
+    pages = {}
+    for file in sorted(glob.glob(os.path.join(path, "**", "*.htm*"), recursive=True)):
+        with open(file, encoding="utf-8", errors="replace") as f:
+            pages[os.path.relpath(file, path)] = f.read()
+    return pages
+
+
+def words(blocks):
+    return set(_WORD_RE.findall(" ".join(blocks).lower()))
+
+
+def run_backend(extract, pages, repeat):
+    total_bytes = sum(len(html.encode()) for html in pages.values())
+    outputs = {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for name, html in pages.items():
+            outputs[name] = extract(html)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for html in pages.values():
+        extract(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "mb_per_s": total_bytes * repeat / elapsed / 1e6,
+        "peak_mb": peak / 1e6,
+        "chars": sum(len("\n\n".join(blocks)) for blocks in outputs.values()),
+        "outputs": outputs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", help="Directory of saved .html pages")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus)
+    if not pages:
+        parser.error(f"No .html files found in {args.corpus}")
+
+    results = {}
+    for name, extract in BACKENDS.items():
+        try:
+            results[name] = run_backend(extract, pages, args.repeat)
+        except ImportError as e:
+            print(f"Skipping backend '{name}': {e}")
+
+    reference = results.get("unstructured")
+    print(f"{len(pages)} pages, {sum(len(h) for h in pages.values()) / 1e6:.1f} MB of HTML\n")
+    print(f"{'backend':<14}{'MB/s':>10}{'peak MB':>10}{'chars':>12}{'recall':>9}{'precision':>11}")
+    for name, result in results.items():
+        recall = precision = float("nan")
+        if reference is not None:
+            hits = extracted = expected = 0
+            for page, blocks in result["outputs"].items():
+                got, want = words(blocks), words(reference["outputs"][page])
+                hits += len(got & want)
+                extracted += len(got)
+                expected += len(want)
+            recall = hits / expected if expected else float("nan")
+            precision = hits / extracted if extracted else float("nan")
+        print(
+            f"{name:<14}{result['mb_per_s']:>10.2f}{result['peak_mb']:>10.1f}"
+            f"{result['chars']:>12}{recall:>9.2f}{precision:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
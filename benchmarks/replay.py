@@ -0,0 +1,235 @@
+"""
+Record and replay the network traffic of a crew run.
+
+All tool traffic goes through ``tools.http_client`` and all LLM traffic
+through ``litellm.completion`` / ``litellm.acompletion``, so patching those
+four entry points captures everything a run sends upstream. In ``record``
+mode the real calls are made and their responses are written to a JSON
+fixture; in ``replay`` mode the fixture answers every call without touching
+the network, after an optional synthetic delay.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+
+def _strip_secrets(url: str) -> str:
+    return re.sub(r"(token|key|api_key)=[^&]+", r"\1=***", url)
+
+
+def _body(kwargs: dict) -> str:
+    body = kwargs.get("data", kwargs.get("content", kwargs.get("json")))
+    if isinstance(body, bytes):
+        body = body.decode()
+    if not isinstance(body, str):
+        body = json.dumps(body, sort_keys=True)
+    return body
+
+
+def http_key(method: str, url: str, kwargs: dict) -> str:
+    raw = json.dumps([method.upper(), _strip_secrets(url), _body(kwargs)])
+    return "http:" + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def llm_key(kwargs: dict) -> str:
+    raw = json.dumps(
+        [kwargs.get("model"), kwargs.get("messages"), kwargs.get("tools"), kwargs.get("temperature")],
+        sort_keys=True,
+        default=str,
+    )
+    return "llm:" + hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ReplayMissError(KeyError):
+    """Raised in replay mode when a call has no recorded response."""
+
+
+class Cassette:
+    """
+    Context manager that records or replays HTTP and LLM calls.
+
+    Args:
+        path (str): The fixture file.
+        mode (str): ``"record"`` or ``"replay"``.
+        latency (dict): Fixed synthetic latency in seconds per kind (``"llm"``
+            or an HTTP endpoint label); kinds not listed use the recorded
+            latency multiplied by ``latency_scale``.
+        latency_scale (float): Multiplier for recorded latencies, 0 disables them.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", latency: dict = None, latency_scale: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode '{mode}'")
+        self.path = path
+        self.mode = mode
+        self.latency = latency or {}
+        self.latency_scale = latency_scale
+        self.entries = {}
+        self.calls = Counter()
+        self.tokens = Counter()
+        self._lock = threading.Lock()
+        self._patches = []
+
+    # -- fixture handling -------------------------------------------------
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        elif self.mode == "replay":
+            raise FileNotFoundError(f"No fixture at {self.path}, record it first with mode='record'")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+
+    def _lookup(self, key: str, kind: str) -> dict:
+        entry = self.entries.get(key)
+        if entry is None:
+            raise ReplayMissError(f"No recorded {kind} response for {key}")
+        return entry
+
+    def _delay(self, kind: str, recorded: float) -> float:
+        if kind in self.latency:
+            return self.latency[kind]
+        return recorded * self.latency_scale
+
+    def _count(self, kind: str, usage: dict = None):
+        with self._lock:
+            self.calls[kind] += 1
+            for name in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                if usage and usage.get(name):
+                    self.tokens[name] += usage[name]
+
+    # -- patching ---------------------------------------------------------
+
+    def _patch(self, owner, name, replacement):
+        self._patches.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, replacement)
+
+    def __enter__(self):
+        import litellm
+        from tools import http_client
+
+        self.load()
+        cassette = self
+        sync_request = http_client.HttpClient.request
+        async_request = http_client.AsyncHttpClient.request
+        completion = litellm.completion
+        acompletion = litellm.acompletion
+
+        def request(client, method, url, endpoint=None, **kwargs):
+            kind = endpoint or "http"
+            key = http_key(method, url, kwargs)
+            if cassette.mode == "record":
+                start = time.perf_counter()
+                response = sync_request(client, method, url, endpoint=endpoint, **kwargs)
+                cassette._store_http(key, response.status_code, response.headers, response.text, time.perf_counter() - start)
+            else:
+                entry = cassette._lookup(key, kind)
+                time.sleep(cassette._delay(kind, entry["latency_s"]))
+                response = _requests_response(entry)
+            cassette._count(kind)
+            return response
+
+        async def arequest(client, method, url, endpoint=None, **kwargs):
+            kind = endpoint or "http"
+            key = http_key(method, url, kwargs)
+            if cassette.mode == "record":
+                start = time.perf_counter()
+                response = await async_request(client, method, url, endpoint=endpoint, **kwargs)
+                await response.aread()
+                cassette._store_http(key, response.status_code, response.headers, response.text, time.perf_counter() - start)
+            else:
+                entry = cassette._lookup(key, kind)
+                await asyncio.sleep(cassette._delay(kind, entry["latency_s"]))
+                response = _httpx_response(entry)
+            cassette._count(kind)
+            return response
+
+        def llm_completion(*args, **kwargs):
+            if kwargs.get("stream"):
+                raise ValueError("Streaming LLM calls cannot be recorded, run the crew with stream=False")
+            key = llm_key(kwargs)
+            if cassette.mode == "record":
+                start = time.perf_counter()
+                response = completion(*args, **kwargs)
+                cassette._store_llm(key, response, time.perf_counter() - start)
+            else:
+                entry = cassette._lookup(key, "llm")
+                time.sleep(cassette._delay("llm", entry["latency_s"]))
+                response = litellm.ModelResponse(**entry["response"])
+            cassette._count("llm", entry_usage(response))
+            return response
+
+        async def llm_acompletion(*args, **kwargs):
+            key = llm_key(kwargs)
+            if cassette.mode == "record":
+                start = time.perf_counter()
+                response = await acompletion(*args, **kwargs)
+                cassette._store_llm(key, response, time.perf_counter() - start)
+            else:
+                entry = cassette._lookup(key, "llm")
+                await asyncio.sleep(cassette._delay("llm", entry["latency_s"]))
+                response = litellm.ModelResponse(**entry["response"])
+            cassette._count("llm", entry_usage(response))
+            return response
+
+        self._patch(http_client.HttpClient, "request", request)
+        self._patch(http_client.AsyncHttpClient, "request", arequest)
+        self._patch(litellm, "completion", llm_completion)
+        self._patch(litellm, "acompletion", llm_acompletion)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for owner, name, original in reversed(self._patches):
+            setattr(owner, name, original)
+        self._patches = []
+        if self.mode == "record":
+            self.save()
+        return False
+
+    def _store_http(self, key, status, headers, text, latency):
+        with self._lock:
+            self.entries[key] = {
+                "status": status,
+                "headers": {"content-type": headers.get("content-type", "")},
+                "text": text,
+                "latency_s": latency,
+            }
+
+    def _store_llm(self, key, response, latency):
+        with self._lock:
+            self.entries[key] = {"response": response.model_dump(), "latency_s": latency}
+
+
+def entry_usage(response) -> dict:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    return usage if isinstance(usage, dict) else usage.model_dump()
+
+
+def _requests_response(entry: dict):
+    import requests
+
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response._content = entry["text"].encode()
+    # Lets iter_content() replay the body of streamed requests.
+    response._content_consumed = True
+    response.headers.update(entry["headers"])
+    response.encoding = "utf-8"
+    return response
+
+
+def _httpx_response(entry: dict):
+    import httpx
+
+    return httpx.Response(entry["status"], content=entry["text"].encode(), headers=entry["headers"])
@@ -0,0 +1,134 @@
+"""
+Peak memory and time to first chunk of the web scraper on very large pages.
+
+Generates synthetic travel pages of the given sizes and runs them through
+the buffered pipeline the scraper used to have (whole body, then the joined
+text, then every chunk) and through the streaming ``PageChunker``. No
+network or LLM calls are made, only the fetch-to-chunks part is measured.
+Each run happens in a fresh interpreter and reports the growth of its peak
+RSS, since tracing allocations would slow the chunk deduplication down tenfold.
+
+    python -m benchmarks.scrape_benchmark --sizes 2 5 10 --max-bytes 0
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools.dedup import deduplicate  # noqa: E402
+from tools.html_extract import extract_elements  # noqa: E402
+from tools.webscraping_tool import READ_SIZE, PageChunker  # noqa: E402
+
+WORDS = (
+    "museum river cathedral market tram ticket hotel breakfast gallery festival "
+    "bridge harbour palace garden bakery wine tour castle square opera beach"
+).split()
+BOILERPLATE = (
+    "<nav><a href='/'>Home</a><a href='/hotels'>Hotels</a><a href='/flights'>Flights</a></nav>"
+    "<script>window.dataLayer = window.dataLayer || []; track('view');</script>"
+    "<div class='cookie'>We use cookies to improve your experience.</div>"
+)
+
+
+def page_pieces(size_mb: float, seed: int = 0):
+    """Yield a synthetic page of ``size_mb`` megabytes in ``READ_SIZE`` pieces, never holding it whole."""
+    rng = random.Random(seed)
+    total = int(size_mb * 1e6)
+    sent = 0
+    pending = b"<html><head><title>City guide</title><style>body{margin:0}</style></head><body>"
+    section = 0
+    while sent < total:
+        section += 1
+        paragraphs = "".join(
+            f"<p>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 120)))}</p>" for _ in range(5)
+        )
+        pending += f"{BOILERPLATE}<article><h2>Day {section}</h2>{paragraphs}</article>".encode()
+        while len(pending) >= READ_SIZE and sent < total:
+            piece, pending = pending[:READ_SIZE], pending[READ_SIZE:]
+            sent += len(piece)
+            yield piece
+    yield pending + b"</body></html>"
+
+
+def buffered(pieces, max_bytes):
+    start = time.perf_counter()
+    html = b"".join(pieces).decode("utf-8", errors="replace")
+    chunks, _ = deduplicate(extract_elements(html, backend="fast"))
+    elapsed = time.perf_counter() - start
+    return len(chunks), elapsed, elapsed
+
+
+def streaming(pieces, max_bytes):
+    start = time.perf_counter()
+    first = None
+    count = 0
+    chunker = PageChunker("benchmark", "utf-8", max_bytes)
+    for data in pieces:
+        chunks = chunker.feed(data)
+        if chunks and first is None:
+            first = time.perf_counter() - start
+        count += len(chunks)
+        if chunker.truncated:
+            break
+    count += len(chunker.close())
+    elapsed = time.perf_counter() - start
+    return count, first if first is not None else elapsed, elapsed
+
+
+PIPELINES = {"buffered": buffered, "streaming": streaming}
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(pipeline: str, size_mb: float, max_bytes: int) -> dict:
+    baseline = peak_rss_mb()
+    chunks, first_s, total_s = PIPELINES[pipeline](page_pieces(size_mb), max_bytes)
+    return {"chunks": chunks, "first_chunk_s": first_s, "total_s": total_s, "peak_mb": peak_rss_mb() - baseline}
+
+
+def measure(pipeline: str, size_mb: float, max_bytes: int) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.scrape_benchmark", "--run", pipeline, "--sizes", str(size_mb), "--max-bytes", str(max_bytes)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"{pipeline} run failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[2, 5, 10], help="Page sizes in MB")
+    parser.add_argument(
+        "--max-bytes", type=int, default=0, help="Byte cap of the streaming pipeline, 0 reads the whole page"
+    )
+    parser.add_argument("--run", choices=sorted(PIPELINES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run(args.run, args.sizes[0], args.max_bytes or sys.maxsize)))
+        return
+
+    print(f"{'page MB':>8}  {'pipeline':<10}{'peak MB':>10}{'first chunk s':>15}{'total s':>10}{'chunks':>8}")
+    for size in args.sizes:
+        for name in PIPELINES:
+            result = measure(name, size, args.max_bytes)
+            print(
+                f"{size:>8.0f}  {name:<10}{result['peak_mb']:>10.1f}{result['first_chunk_s']:>15.2f}"
+                f"{result['total_s']:>10.2f}{result['chunks']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
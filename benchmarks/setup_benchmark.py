@@ -0,0 +1,67 @@
+"""
+Measure the per-request setup cost of a crew run.
+
+Compares building the LLM, the tools and the three agents from scratch for
+every request (the old TripCrew behaviour) with copying the agent templates
+held by the process-level registry.
+
+    python -m benchmarks.setup_benchmark --runs 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crewai import LLM  # noqa: E402
+from agents.cityexpert_agent import CityExpertAagent  # noqa: E402
+from agents.citypanner_agent import CityPannerAgent  # noqa: E402
+from agents.travel_concierge_agent import TravelConciergeAgent  # noqa: E402
+from registry import ResourceRegistry  # noqa: E402
+
+
+def setup_from_scratch():
+    llm = LLM(model="gemini/gemini-2.0-flash")
+    return [
+        CityExpertAagent(llm).create_agent(),
+        CityPannerAgent(llm).create_agent(),
+        TravelConciergeAgent(llm).create_agent(),
+    ]
+
+
+def setup_from_registry(registry):
+    return [registry.agent("guide"), registry.agent("planner"), registry.agent("concierge")]
+
+
+def measure(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    print(
+        f"{name:<22}mean {statistics.mean(timings) * 1000:8.2f} ms   "
+        f"p50 {timings[len(timings) // 2] * 1000:8.2f} ms   max {timings[-1] * 1000:8.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    registry = ResourceRegistry()
+    print(f"registry warmup: {registry.warmup(stream_variants=(False,)) * 1000:.2f} ms (paid once per process)\n")
+    report("from scratch", measure(setup_from_scratch, args.runs))
+    report("registry copies", measure(lambda: setup_from_registry(registry), args.runs))
+
+
+if __name__ == "__main__":
+    main()
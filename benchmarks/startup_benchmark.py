@@ -0,0 +1,78 @@
+"""
+Check the cold-start cost of the entry point modules against a budget.
+
+Each module is imported in a fresh interpreter, and the script records the
+import time, the peak RSS and whether any of the heavy dependencies were
+pulled in eagerly. It exits non-zero when a budget is exceeded, so it can run
+in CI to catch start-up regressions.
+
+    python -m benchmarks.startup_benchmark --max-import-s 1.5 --max-rss-mb 150
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["main", "app", "jobs", "plan_cache", "events", "metrics"]
+# Importing any of these at start-up means a lazy import was lost.
+HEAVY_MODULES = ["crewai", "litellm", "unstructured", "langchain_groq", "outlines", "langchain_core"]
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "import_s": elapsed,
+    "rss_mb": rss_kb / 1024,
+    "heavy": sorted(m for m in {heavy!r} if m in sys.modules),
+}}))
+"""
+
+
+def probe(module: str) -> dict:
+    code = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-import-s", type=float, default=float(os.getenv("STARTUP_MAX_IMPORT_S", 1.5)))
+    parser.add_argument("--max-rss-mb", type=float, default=float(os.getenv("STARTUP_MAX_RSS_MB", 150)))
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'module':<14}{'import s':>10}{'RSS MB':>10}  heavy imports")
+    for module in args.modules:
+        result = probe(module)
+        if "error" in result:
+            print(f"{module:<14}  error: {result['error']}")
+            failures.append(f"{module} failed to import")
+            continue
+        print(f"{module:<14}{result['import_s']:>10.3f}{result['rss_mb']:>10.1f}  {', '.join(result['heavy']) or '-'}")
+        if result["import_s"] > args.max_import_s:
+            failures.append(f"{module} took {result['import_s']:.2f}s to import (budget {args.max_import_s}s)")
+        if result["rss_mb"] > args.max_rss_mb:
+            failures.append(f"{module} used {result['rss_mb']:.0f} MB RSS (budget {args.max_rss_mb} MB)")
+        if result["heavy"]:
+            failures.append(f"{module} eagerly imports {', '.join(result['heavy'])}")
+
+    if failures:
+        print("\nStart-up budget exceeded:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("\nAll modules within the start-up budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import contextvars
+import functools
+import inspect
+import json
+import queue
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+_current = contextvars.ContextVar("progress_emitter", default=None)
+_CLOSED = object()
+
+
+class ProgressEmitter:
+    """
+    Thread safe queue of progress events for one crew run.
+
+    The crew thread emits events while the HTTP response iterates over them
+    and turns each one into a Server-Sent Event.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stage = None
+        self._queue = queue.Queue()
+
+    def emit(self, event: str, **data):
+        data["elapsed_s"] = round(time.perf_counter() - self.started, 3)
+        self._queue.put((event, data))
+
+    def close(self):
+        self._queue.put(_CLOSED)
+
+    def drain(self) -> list:
+        """Return the events emitted so far without waiting, for callers that poll."""
+        events = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return events
+            if item is not _CLOSED:
+                events.append(item)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is _CLOSED:
+                return
+            yield item
+
+    def sse(self):
+        """Yield the events formatted as ``text/event-stream`` messages."""
+        for event, data in self:
+            yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class EventCounter:
+    """
+    Emitter that only counts the events emitted while it is bound.
+
+    Used to measure the upstream calls of one part of a run: ``llm_call``
+    events answered from the cache are counted as ``llm_call_cached``.
+    """
+
+    def __init__(self):
+        self.stage = None
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, **data):
+        if data.get("cached"):
+            event = f"{event}_cached"
+        with self._lock:
+            self.counts[event] += 1
+
+
+@contextmanager
+def bind(emitter: ProgressEmitter):
+    """Send the events emitted in this context (and thread) to ``emitter``."""
+    token = _current.set(emitter)
+    try:
+        yield emitter
+    finally:
+        _current.reset(token)
+
+
+def emit(event: str, **data):
+    """Emit an event to the bound emitter, if any. Costs a context lookup otherwise."""
+    emitter = _current.get()
+    if emitter is not None:
+        emitter.emit(event, **data)
+
+
+def report_tool_call(run):
+    """Decorate a tool's ``_run`` or ``_arun`` so every call emits its arguments and latency."""
+    if inspect.iscoroutinefunction(run):
+
+        @functools.wraps(run)
+        async def async_wrapper(self, *args, **kwargs):
+            if _current.get() is None:
+                return await run(self, *args, **kwargs)
+            emit("tool_started", tool=self.name, args=kwargs or list(args))
+            start = time.perf_counter()
+            try:
+                result = await run(self, *args, **kwargs)
+            except Exception as e:
+                emit("tool_failed", tool=self.name, latency_s=round(time.perf_counter() - start, 3), error=str(e))
+                raise
+            emit("tool_finished", tool=self.name, latency_s=round(time.perf_counter() - start, 3))
+            return result
+
+        return async_wrapper
+
+    @functools.wraps(run)
+    def wrapper(self, *args, **kwargs):
+        if _current.get() is None:
+            return run(self, *args, **kwargs)
+        emit("tool_started", tool=self.name, args=kwargs or list(args))
+        start = time.perf_counter()
+        try:
+            result = run(self, *args, **kwargs)
+        except Exception as e:
+            emit("tool_failed", tool=self.name, latency_s=round(time.perf_counter() - start, 3), error=str(e))
+            raise
+        emit("tool_finished", tool=self.name, latency_s=round(time.perf_counter() - start, 3))
+        return result
+
+    return wrapper
+
+
+class CrewProgress:
+    """
+    crewAI step and task callbacks that forward progress to the bound emitter.
+
+    Tasks run sequentially, so the completion of one task marks the start of
+    the next one in ``stages``.
+    """
+
+    def __init__(self, stages: list):
+        self.stages = stages
+        self._index = 0
+        self._lock = threading.Lock()
+
+    def started(self):
+        self._set_stage(self.stages[0])
+        emit("task_started", stage=self.stages[0])
+
+    def step_callback(self, step):
+        text = getattr(step, "thought", None) or getattr(step, "text", None) or getattr(step, "output", None)
+        emit("agent_step", stage=self._stage(), tool=getattr(step, "tool", None), text=str(text) if text else None)
+
+    def task_callback(self, output):
+        with self._lock:
+            stage = self._stage()
+            self._index += 1
+            next_stage = self._stage()
+        emit("task_finished", stage=stage, output=getattr(output, "raw", str(output)))
+        self._set_stage(next_stage)
+        if next_stage is not None:
+            emit("task_started", stage=next_stage)
+
+    def _stage(self):
+        return self.stages[self._index] if self._index < len(self.stages) else None
+
+    def _set_stage(self, stage):
+        emitter = _current.get()
+        if emitter is not None:
+            emitter.stage = stage
+
+
+_stream_listener_installed = False
+
+
+def install_llm_stream_listener():
+    """
+    Forward streamed LLM chunks from crewAI's event bus to the bound emitter.
+
+    Bus handlers run in the thread that emitted the event, which is the crew
+    thread, so the context variable tells which request the chunk belongs to.
+    """
+    global _stream_listener_installed
+    if _stream_listener_installed:
+        return
+    try:
+        from crewai.utilities.events import LLMStreamChunkEvent, crewai_event_bus
+    except ImportError:
+        return
+
+    @crewai_event_bus.on(LLMStreamChunkEvent)
+    def _forward_chunk(source, event):
+        emitter = _current.get()
+        if emitter is not None:
+            emitter.emit("llm_chunk", stage=emitter.stage, text=event.chunk)
+
+    _stream_listener_installed = True
@@ -0,0 +1,173 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+def _load_result(result):
+    # Results stored before they were kept as JSON are the bare plan text.
+    try:
+        return json.loads(result)
+    except (TypeError, ValueError):
+        return result
+
+
+class JobStore:
+    """
+    SQLite table holding the status, result and timings of every job.
+
+    Kept on local disk so queued and finished jobs survive a restart of the
+    API process.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(os.getenv("CACHE_DIR", ".cache"), "jobs.sqlite3")
+        self._lock = threading.Lock()
+        self.__conn = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # Opened on first use so creating a store at import time touches no files.
+        if self.__conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " status TEXT NOT NULL,"
+                " inputs TEXT NOT NULL,"
+                " result TEXT,"
+                " error TEXT,"
+                " created_at REAL NOT NULL,"
+                " started_at REAL,"
+                " finished_at REAL)"
+            )
+            self.__conn = conn
+        return self.__conn
+
+    def create(self, inputs: dict) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, inputs, created_at) VALUES (?, 'queued', ?, ?)",
+                (job_id, json.dumps(inputs), time.time()),
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, inputs, result, error, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, status, inputs, result, error, created_at, started_at, finished_at = row
+        return {
+            "job_id": job_id,
+            "status": status,
+            "inputs": json.loads(inputs),
+            "result": _load_result(result),
+            "error": error,
+            "queue_wait_s": (started_at or time.time()) - created_at,
+            "run_s": ((finished_at or time.time()) - started_at) if started_at else None,
+        }
+
+    def pending(self) -> list:
+        """Jobs that were queued or running when the process last stopped, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, inputs FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [(job_id, json.loads(inputs)) for job_id, inputs in rows]
+
+
+class JobQueue:
+    """
+    Bounded queue of trip planning jobs served by a pool of worker threads.
+
+    ``submit`` returns a job id immediately, or raises ``QueueFullError`` when
+    ``max_queue`` jobs are already waiting so the API can answer with 429.
+    """
+
+    def __init__(self, runner, workers: int = 2, max_queue: int = 20, store: JobStore = None):
+        self.runner = runner
+        self.workers = workers
+        self.store = store or JobStore()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        # Jobs interrupted by a restart are run again from the start.
+        for job_id, inputs in self.store.pending():
+            self.store.update(job_id, status="queued", started_at=None)
+            try:
+                self._queue.put_nowait((job_id, inputs))
+            except queue.Full:
+                self.store.update(job_id, status="failed", error="Dropped on restart, the queue was full", finished_at=time.time())
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"crew-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = None):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, inputs: dict) -> str:
+        job_id = self.store.create(inputs)
+        try:
+            self._queue.put_nowait((job_id, inputs))
+        except queue.Full:
+            self.store.update(job_id, status="rejected", error="Job queue is full", finished_at=time.time())
+            raise QueueFullError("Job queue is full, try again later")
+        return job_id
+
+    def get(self, job_id: str):
+        return self.store.get(job_id)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "running": self._running,
+            "workers": self.workers,
+            "max_queue": self._queue.maxsize,
+        }
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job_id, inputs = item
+            with self._lock:
+                self._running += 1
+            self.store.update(job_id, status="running", started_at=time.time())
+            try:
+                result = self.runner(inputs)
+                self.store.update(job_id, status="done", result=json.dumps(result), finished_at=time.time())
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                self.store.update(job_id, status="failed", error=str(e), finished_at=time.time())
+            finally:
+                with self._lock:
+                    self._running -= 1
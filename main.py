@@ -1,56 +1,323 @@
 
-from crewai import Crew,LLM
-from agents.travel_concierge_agent import TravelConciergeAgent
-from agents.cityexpert_agent import CityExpertAagent
-from agents.citypanner_agent import CityPannerAgent
-from tasks.city_planner_task import cityPlannerTask
-from tasks.travel_concierge_task import TravelConciergeTask
-from tasks.local_guide_task import CityGuideTask
-from langchain_groq import ChatGroq
-
-from typing import TypedDict
-from dotenv import load_dotenv
+# crewAI, litellm and the tools are heavy to import, so they are imported
+# inside TripCrew on first use. Importing this module stays cheap and has no
+# side effects, which keeps API and Streamlit start-up and worker recycling fast.
+from concurrent.futures import ThreadPoolExecutor
+from events import emit
+import contextvars
+import metrics
 import os
-load_dotenv()
-os.environ['GROQ_API_KEY']=os.getenv('GROQ_API_KEY')
+import time
 
-llm=ChatGroq(model='gemma2-9b-it')
+
+STAGES = ["planner", "guide", "concierge"]
 
 
 class TripCrew:
-    def __init__(self, origin, cities, interests, date_range):
+    def __init__(self, origin, cities, interests, date_range, stream=False, fan_out=None, max_city_workers=None, registry=None, stage_cache=None):
         self.orgin=origin
         self.cities=cities
         self.interests=interests
         self.data_range=date_range
-        self.llm = LLM(model='gemini/gemini-2.0-flash')
-        
+        self.stream=stream
+        if registry is None:
+            from registry import get_registry
+
+            registry = get_registry()
+        # LLM clients, tools and agent templates are shared by every run in the process
+        self.registry = registry
+        self.llm = self.registry.llm(stream)
+        # With several candidate cities each one is researched by its own
+        # sub-task in parallel and the planner only ranks the summaries.
+        self.fan_out = fan_out if fan_out is not None else os.getenv("CITY_FAN_OUT", "true").lower() == "true"
+        self.max_city_workers = max_city_workers or int(os.getenv("CITY_RESEARCH_CONCURRENCY", 4))
+        from stage_cache import get_stage_cache
+
+        # Outputs of earlier runs, reused by the stages whose inputs did not change.
+        self.stage_cache = stage_cache or get_stage_cache()
+        # "ran", "reused" or "prewarmed" for every stage, and per city for the city research.
+        self.stage_report = {}
+        # Stages that ran, with their task, hand-off context and the outputs it was compacted from.
+        self.handoffs = {}
+
+    def city_list(self):
+        cities = []
+        for city in self.cities.split(","):
+            city = city.strip()
+            if city and city.lower() not in [c.lower() for c in cities]:
+                cities.append(city)
+        return cities
+
+    def research_stage(self, stage, city, inputs, build_task):
+        """
+        Run the one-task research crew ``build_task(agent)`` for ``city``, or
+        reuse its cached output, and return the summary text. ``stage`` names
+        the cache entry, the progress events and the stage report entry.
+        """
+        from crewai import Crew
+
+        cached = self.stage_cache.get(stage, inputs)
+        if cached is not None:
+            self.stage_report.setdefault(stage, {})[city] = self.reuse_label(cached)
+            emit(f"{stage}_finished", city=city, output=cached.raw, reused=True)
+            return cached.raw
+
+        agent = self.registry.agent("planner", self.stream)
+        task = build_task(agent)
+        emit(f"{stage}_started", city=city)
+        with metrics.span("task", stage, city=city):
+            result = Crew(agents=[agent], tasks=[task], verbose=True).kickoff()
+        self.stage_cache.set(stage, inputs, result)
+        self.stage_report.setdefault(stage, {})[city] = "ran"
+        emit(f"{stage}_finished", city=city, output=result.raw)
+        return result.raw
+
+    def research_city(self, city):
+        from tasks.city_planner_task import cityPlannerTask
+
+        inputs = {"model": self.registry.model, "origin": self.orgin, "city": city, "interests": self.interests, "date_range": self.data_range}
+        return self.research_stage(
+            "city_research", city, inputs,
+            lambda agent: cityPlannerTask().city_research_task(agent, self.orgin, city, self.interests, self.data_range),
+        )
+
+    def research_destination(self, city):
+        """The research of ``city`` without the flight cost, which travellers from any origin can share."""
+        from tasks.city_planner_task import cityPlannerTask
+
+        inputs = {"model": self.registry.model, "city": city, "interests": self.interests, "date_range": self.data_range}
+        return self.research_stage(
+            "destination_research", city, inputs,
+            lambda agent: cityPlannerTask().destination_research_task(agent, city, self.interests, self.data_range),
+        )
+
+    def flight_cost(self, city):
+        """The flight cost from the origin to ``city``, the origin dependent part of the city research."""
+        from tasks.city_planner_task import cityPlannerTask
+
+        inputs = {"model": self.registry.model, "origin": self.orgin, "city": city, "date_range": self.data_range}
+        return self.research_stage(
+            "flight_cost", city, inputs,
+            lambda agent: cityPlannerTask().flight_cost_task(agent, self.orgin, city, self.data_range),
+        )
+
+    def research_cities(self, cities, research=None):
+        """
+        Research every candidate city concurrently, at most ``max_city_workers`` at a time.
+
+        A city whose research fails is reported as such to the ranking step
+        instead of failing the whole plan.
+
+        Args:
+            research: Called with each city, ``research_city`` by default.
+        """
+        research = research or self.research_city
+        with ThreadPoolExecutor(max_workers=min(self.max_city_workers, len(cities))) as pool:
+            # Each city gets its own copy of the context so progress events
+            # emitted by its tools still reach the caller's stream.
+            futures = {city: pool.submit(contextvars.copy_context().run, research, city) for city in cities}
+        summaries = {}
+        for city, future in futures.items():
+            try:
+                summaries[city] = future.result()
+            except Exception as e:
+                print(f"Research for {city} failed: {e}")
+                summaries[city] = f"Research failed: {str(e)}"
+        if all(summary.startswith("Research failed") for summary in summaries.values()):
+            raise ValueError("research failed for every city")
+        return summaries
+
+    def timed_task_callback(self, task_callback=None):
+        """
+        Wrap ``task_callback`` so the duration of each task is recorded as a span.
+
+        Tasks run one after the other, so a task runs from the end of the
+        previous one (or the kickoff) until its own callback.
+        """
+        state = {"index": 0, "start": time.perf_counter()}
+
+        def callback(output):
+            stage = STAGES[state["index"]] if state["index"] < len(STAGES) else f"task_{state['index']}"
+            metrics.record_span("task", stage, time.perf_counter() - state["start"])
+            state["index"] += 1
+            state["start"] = time.perf_counter()
+            if task_callback is not None:
+                task_callback(output)
+
+        return callback
+
+    def  run_crew(self, step_callback=None, task_callback=None):
+        with metrics.span("crew", "kickoff", cities=self.cities):
+            return self._run_crew(step_callback, task_callback)
+
+    def run_stage(self, agent, task, step_callback=None, task_callback=None):
+        """Run a single task in its own crew so it only sees the context we give it."""
+        from crewai import Crew
+
+        crew=Crew(
+            agents=[agent],
+            tasks=[task],
+            verbose=True,
+            step_callback=step_callback,
+            task_callback=task_callback,
+        )
+        return crew.kickoff()
+
+    def cached_stage(self, stage, inputs, run, model=None, task_callback=None):
+        """
+        Return the cached output of ``stage`` for ``inputs``, or run it and cache the result.
+
+        A reused stage still goes through ``task_callback`` so progress
+        reporting moves on to the next stage.
+        """
+        output = self.stage_cache.get(stage, inputs, model)
+        if output is not None:
+            self.stage_report[stage] = self.reuse_label(output)
+            emit("stage_reused", stage=stage)
+            if task_callback is not None:
+                task_callback(output)
+            return output
+        output = run()
+        self.stage_cache.set(stage, inputs, output)
+        self.stage_report[stage] = "ran"
+        return output
 
-    def  run_crew(self):
+    def reuse_label(self, output):
+        """How a reused stage output was produced: ``prewarmed`` in the background, or ``reused`` from an earlier request."""
+        return "prewarmed" if getattr(output, "source", None) == "prewarm" else "reused"
+
+    def trip_inputs(self):
+        return {"model": self.registry.model, "origin": self.orgin, "cities": self.cities, "interests": self.interests, "date_range": self.data_range}
+
+    def plan_city(self, step_callback=None, task_callback=None, summaries=None):
+        """
+        Planner stage: pick the destination among the candidate cities.
+
+        ``summaries`` are city research summaries made elsewhere, e.g. shared
+        by the travellers of a batch; the planner then only ranks them.
+        """
+        from tasks.city_planner_task import cityPlannerTask
+        from tasks.handoff import CityChoice
+
+        def plan():
+            agent=self.registry.agent("planner", self.stream)
+            cities = self.city_list()
+            research = summaries
+            if research is None and self.fan_out and len(cities) > 1:
+                research = self.research_cities(cities)
+            if research is not None:
+                task=cityPlannerTask().ranking_task(agent,self.orgin,research,self.interests,self.data_range)
+            else:
+                task=cityPlannerTask().planner_task(agent,self.orgin,self.cities,self.interests,self.data_range)
+            self.handoffs["planner"] = (task, "", [])
+            return self.run_stage(agent,task,step_callback,task_callback)
+
+        return self.cached_stage("planner", self.trip_inputs(), plan, CityChoice, task_callback)
+
+    def city_guide(self, choice, step_callback=None, task_callback=None):
+        """Guide stage: an in-depth guide of the chosen city."""
+        from tasks.local_guide_task import CityGuideTask
+        from tasks.handoff import CityGuide, compact_for_guide
+
+        context=compact_for_guide(choice)
+
+        def guide():
+            agent = self.registry.agent("guide", self.stream)
+            task=CityGuideTask().guide_task(agent,self.orgin,self.interests,context=context)
+            self.handoffs["guide"] = (task, context, [choice])
+            return self.run_stage(agent,task,step_callback,task_callback)
+
+        return self.cached_stage("guide", {**self.trip_inputs(), "context": context}, guide, CityGuide, task_callback)
+
+    def concierge_plan(self, choice, guide_output, step_callback=None, task_callback=None, omit=()):
+        """
+        Concierge stage: the day by day itinerary and budget.
+
+        Args:
+            omit (tuple): Planner fields to leave out of the hand-off, e.g. the
+                flight cost when the planner ran for another origin.
+        """
+        from tasks.travel_concierge_task import TravelConciergeTask
+        from tasks.handoff import compact_for_concierge
+        from tools.rate_limit import HIGH, priority
+
+        context=compact_for_concierge(choice,guide_output,omit=omit)
+
+        def concierge():
+            agent=self.registry.agent("concierge", self.stream)
+            task=TravelConciergeTask().plan_task(agent,self.orgin,self.interests,self.data_range,context=context)
+            self.handoffs["concierge"] = (task, context, [choice, guide_output])
+            return self.run_stage(agent,task,step_callback,task_callback)
+
+        # The final itinerary goes ahead of other crews' research when the upstreams are busy.
+        with priority(HIGH):
+            return self.cached_stage("concierge", {**self.trip_inputs(), "context": context}, concierge, task_callback=task_callback)
+
+    def _run_crew(self, step_callback=None, task_callback=None):
+        # The stages run as separate crews instead of one sequential crew: a
+        # sequential crew hands every earlier report, in full, to each later
+        # task, while here each stage only gets the compacted fields it needs.
+        # Each stage is cached on exactly those inputs, so a changed request
+        # only re-runs the stages it affects.
+        if metrics.ENABLED:
+            task_callback = self.timed_task_callback(task_callback)
         try:
-            city_expert_agent = CityExpertAagent(self.llm).create_agent()
-            city_planner_agent=CityPannerAgent(self.llm).create_agent()
-            travel_concierge_agent=TravelConciergeAgent(self.llm).create_agent()   
-            city_planner_task=cityPlannerTask().planner_task(city_planner_agent,self.orgin,self.cities,self.interests,self.data_range)
-            city_expert_task=CityGuideTask().guide_task(city_expert_agent,self.orgin,self.interests,self.data_range)
-            travel_concierge_task=TravelConciergeTask().plan_task(travel_concierge_agent,self.orgin,self.interests,self.data_range)
-
-            crew=Crew(
-                agents=[city_planner_agent,city_expert_agent,travel_concierge_agent],
-                tasks=[city_planner_task,city_expert_task,travel_concierge_task],
-                verbose=True,                
-            )
-
-
-            result=crew.kickoff()
-            
-            
+            choice=self.plan_city(step_callback,task_callback)
+            guide_output=self.city_guide(choice,step_callback,task_callback)
+            result=self.concierge_plan(choice,guide_output,step_callback,task_callback)
+
+            self.handoff_report = self.build_handoff_report(self.handoffs)
+            emit("handoff_report", report=self.handoff_report)
+            emit("stage_report", stages=self.stage_report)
             return result
         except Exception as e:
             raise ValueError(f'crew not working {str(e)}') 
 
+    def build_handoff_report(self, handoffs):
+        """
+        Prompt tokens of each task with the compacted hand-off, and what they
+        would have been had the task received the previous reports in full.
+        """
+        from tasks.handoff import count_tokens
+
+        report = {}
+        for stage, (task, context, previous) in handoffs.items():
+            after = count_tokens(task.description)
+            full_context = "\n\n".join(getattr(output, "raw", str(output)) for output in previous)
+            before = after - count_tokens(context) + count_tokens(full_context) if context else after
+            report[stage] = {"before": before, "after": after}
+        return report
+
+
+def plan_trip(inputs: dict) -> dict:
+    """
+    Run the crew for one request and return the raw trip plan and the stage
+    report. Used as the job of the crew worker processes, so the result is
+    plain data that can be sent back to the API process.
+    """
+    crew = TripCrew(
+        origin=inputs["origin"],
+        cities=inputs["cities"],
+        interests=inputs["interests"],
+        date_range=inputs["date_range"],
+    )
+    output = crew.run_crew()
+    return {"trip_plan": str(output), "stages": crew.stage_report}
+
+
+def preload():
+    """Import crewAI and build the non-streaming LLM clients, tools and agent templates."""
+    from dotenv import load_dotenv
+    from registry import get_registry
+
+    load_dotenv()
+    print(f"Crew worker {os.getpid()} preloaded in {get_registry().warmup(stream_variants=(False,)):.2f}s")
+
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
     crew=TripCrew( origin='Bangalore',
     cities='paris,london,berlin,japan',
     interests='food,trucking,adventure,history,watersports,beautiful_locations',
@@ -0,0 +1,250 @@
+"""
+Prometheus metrics and span-style tracing for crews, tasks, tools and LLM calls.
+
+Set ``METRICS_ENABLED=false`` to turn everything into a single boolean check.
+"""
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+
+ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+_metrics = {}
+_collectors = []
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{v}"'.replace("\n", " ") for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help, self.type = name, help, "counter"
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        for key, value in self.values.items():
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+
+class Gauge(Counter):
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.type = "gauge"
+
+    def set(self, value: float, **labels):
+        if not ENABLED:
+            return
+        with _lock:
+            self.values[_label_key(labels)] = value
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.type = name, help, "histogram"
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, value: float, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with _lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        for key, (counts, total, count) in self.values.items():
+            for bound, n in zip(self.buckets, counts):
+                yield f"{self.name}_bucket{_format_labels(key, (('le', str(bound)),))} {n}"
+            yield f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {count}"
+            yield f"{self.name}_sum{_format_labels(key)} {total}"
+            yield f"{self.name}_count{_format_labels(key)} {count}"
+
+
+def _register(metric):
+    with _lock:
+        return _metrics.setdefault(metric.name, metric)
+
+
+def counter(name: str, help: str) -> Counter:
+    return _register(Counter(name, help))
+
+
+def gauge(name: str, help: str) -> Gauge:
+    return _register(Gauge(name, help))
+
+
+def histogram(name: str, help: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help, buckets))
+
+
+def register_collector(collect):
+    """Register a callable run at scrape time to refresh gauges (queue depth, cache stats, ...)."""
+    _collectors.append(collect)
+
+
+def render() -> str:
+    """Return all metrics in the Prometheus text exposition format."""
+    for collect in list(_collectors):
+        try:
+            collect()
+        except Exception as e:
+            print(f"Metrics collector {collect} failed: {e}")
+    lines = []
+    with _lock:
+        for metric in _metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+SPAN_SECONDS = histogram("tour_planner_span_duration_seconds", "Duration of traced operations by kind and name")
+SPAN_ERRORS = counter("tour_planner_span_errors_total", "Traced operations that raised, by kind and name")
+LLM_TOKENS = counter("tour_planner_llm_tokens_total", "LLM tokens used, by model and direction")
+HTTP_SECONDS = histogram("tour_planner_http_request_duration_seconds", "Upstream HTTP call latency by endpoint and outcome")
+CACHE_REQUESTS = counter("tour_planner_cache_requests_total", "Cache lookups by cache and result")
+
+# -- tracing ----------------------------------------------------------------
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+recent_spans = deque(maxlen=int(os.getenv("TRACE_BUFFER_SIZE", 500)))
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes):
+    """
+    Time an operation and record it as a span of the current trace.
+
+    Spans nest through a context variable: a tool call inside a task inside
+    a crew kickoff shares the kickoff's trace id and points at its parent.
+    """
+    if not ENABLED:
+        yield None
+        return
+    parent = _current_span.get()
+    record = {
+        "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex,
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent["span_id"] if parent else None,
+        "kind": kind,
+        "name": name,
+        "attributes": attributes,
+        "start": time.time(),
+    }
+    token = _current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = str(e)
+        SPAN_ERRORS.inc(kind=kind, name=name)
+        raise
+    finally:
+        _current_span.reset(token)
+        record["duration_s"] = time.perf_counter() - start
+        SPAN_SECONDS.observe(record["duration_s"], kind=kind, name=name)
+        recent_spans.append(record)
+
+
+def record_span(kind: str, name: str, duration: float, error: str = None, **attributes):
+    """Record an already finished operation, e.g. one reported by a callback."""
+    if not ENABLED:
+        return
+    parent = _current_span.get()
+    SPAN_SECONDS.observe(duration, kind=kind, name=name)
+    if error:
+        SPAN_ERRORS.inc(kind=kind, name=name)
+    recent_spans.append({
+        "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex,
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent["span_id"] if parent else None,
+        "kind": kind,
+        "name": name,
+        "attributes": attributes,
+        "start": time.time() - duration,
+        "duration_s": duration,
+        "error": error,
+    })
+
+
+def traced_tool(run):
+    """Decorate a tool's ``_run`` or ``_arun`` so each call is recorded as a ``tool`` span."""
+    if inspect.iscoroutinefunction(run):
+
+        @functools.wraps(run)
+        async def async_wrapper(self, *args, **kwargs):
+            if not ENABLED:
+                return await run(self, *args, **kwargs)
+            with span("tool", self.name):
+                return await run(self, *args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(run)
+    def wrapper(self, *args, **kwargs):
+        if not ENABLED:
+            return run(self, *args, **kwargs)
+        with span("tool", self.name):
+            return run(self, *args, **kwargs)
+
+    return wrapper
+
+
+_llm_callbacks_installed = False
+
+
+def install_llm_callbacks():
+    """Record latency, token usage and errors of every litellm call."""
+    global _llm_callbacks_installed
+    if not ENABLED or _llm_callbacks_installed:
+        return
+    import litellm
+
+    def on_success(kwargs, response, start_time, end_time):
+        model = kwargs.get("model", "unknown")
+        record_span("llm", model, (end_time - start_time).total_seconds())
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, model=model, direction="prompt")
+            LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, direction="completion")
+
+    def on_failure(kwargs, response, start_time, end_time):
+        model = kwargs.get("model", "unknown")
+        error = kwargs.get("exception") or "LLM call failed"
+        record_span("llm", model, (end_time - start_time).total_seconds(), error=str(error))
+
+    litellm.success_callback.append(on_success)
+    litellm.failure_callback.append(on_failure)
+    _llm_callbacks_installed = True
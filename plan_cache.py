@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import threading
+
+from tools.cache import DiskCache
+
+
+def normalize_list(value: str) -> list:
+    items = {" ".join(item.lower().split()) for item in value.split(",")}
+    return sorted(item for item in items if item)
+
+
+def normalize_trip(inputs: dict) -> dict:
+    """
+    Normalize trip inputs so requests that only differ in case, whitespace or
+    the order of cities and interests map to the same plan.
+    """
+    return {
+        "origin": " ".join(inputs["origin"].lower().split()),
+        "cities": normalize_list(inputs["cities"]),
+        "interests": normalize_list(inputs["interests"]),
+        "date_range": " ".join(inputs["date_range"].lower().split()),
+    }
+
+
+def trip_key(inputs: dict) -> str:
+    normalized = json.dumps(normalize_trip(inputs), sort_keys=True)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Run a function at most once at a time per key.
+
+    Callers arriving while a call for the same key is in flight wait for it
+    and share its result (or exception) instead of starting their own.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn):
+        """
+        Returns:
+            tuple: The result of ``fn`` and whether it was shared with an in-flight call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class PlanCache:
+    """
+    Finished trip plans keyed by normalized inputs, plus single-flight
+    coalescing of identical requests that are still running.
+    """
+
+    def __init__(self, cache: DiskCache = None):
+        self.cache = cache or DiskCache(
+            "trip_plans",
+            ttl=float(os.getenv("PLAN_CACHE_TTL", 24 * 3600)),
+            max_entries=int(os.getenv("PLAN_CACHE_MAX_ENTRIES", 1000)),
+        )
+        self.flights = SingleFlight()
+        self.coalesced = 0
+
+    def get_or_run(self, inputs: dict, run):
+        """
+        Return the cached plan for ``inputs`` or compute it with ``run``.
+
+        Returns:
+            tuple: The plan and how it was obtained: ``"hit"``, ``"coalesced"`` or ``"miss"``.
+        """
+        key = trip_key(inputs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached, "hit"
+
+        def compute():
+            # Another request may have finished the same plan while we waited for the lock.
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            plan = run()
+            self.cache.set(key, plan)
+            return plan
+
+        plan, shared = self.flights.do(key, compute)
+        if shared:
+            self.coalesced += 1
+            return plan, "coalesced"
+        return plan, "miss"
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "coalesced": self.coalesced, "in_flight": self.flights.in_flight()}
@@ -0,0 +1,301 @@
+"""
+Prewarm the city research and guide stages of popular destinations.
+
+Once a day, during the off-peak hours of ``PREWARM_HOURS``, the research and
+guide stages run for the destinations listed in ``PREWARM_CONFIG`` and for
+the most requested ones of the last ``PREWARM_TRAFFIC_DAYS`` days. That fills
+the stage, search and LLM caches, so a cold live request for one of them
+only pays for the planner and the concierge. A run stops once it has used
+its LLM, search or scrape budget, and ``report`` tells how often live
+requests were served from prewarmed stages.
+"""
+import calendar
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import metrics
+from events import EventCounter, bind
+from plan_cache import normalize_list
+from stage_cache import StageCache, StageOutput, get_stage_cache, month_window
+from tools.cache import DiskCache
+
+
+PREWARM_TARGETS = metrics.counter("tour_planner_prewarm_targets_total", "Prewarm targets processed, by outcome")
+PREWARM_LIVE = metrics.counter(
+    "tour_planner_prewarm_live_stages_total", "City research and guide stages of live requests, by how they were obtained"
+)
+
+# Stages prewarming can fill. The planner and concierge depend on the whole request.
+LIVE_STAGES = ("city_research", "guide")
+# How often the scheduler writes the buffered counts and checks whether the off-peak window has started.
+SCHEDULE_POLL = 60
+# Buffered traffic entries above which a request writes them itself, e.g. when the scheduler is not running.
+MAX_PENDING = 500
+
+
+def parse_hours(value: str) -> tuple:
+    """``"2-6"`` to ``(2, 6)``: from 02:00 to 06:00 local time. The window may wrap around midnight."""
+    start, _, end = value.partition("-")
+    return int(start), int(end)
+
+
+def month_range(month: str) -> str:
+    """The whole of a ``YYYY-MM`` month as a date range."""
+    year, number = (int(part) for part in month.split("-"))
+    return f"{year:04d}-{number:02d}-01 to {year:04d}-{number:02d}-{calendar.monthrange(year, number)[1]:02d}"
+
+
+def target_key(target: dict) -> str:
+    return json.dumps([
+        " ".join(target["origin"].lower().split()),
+        " ".join(target["city"].lower().split()),
+        normalize_list(target["interests"]),
+        month_window(target["date_range"]),
+    ])
+
+
+class Prewarmer:
+    """
+    Scheduled background prewarming with a spend budget and live hit reporting.
+
+    A target is one city for one origin, set of interests and month, since the
+    cached stages are keyed on those. Targets whose stages are still cached
+    cost nothing.
+    """
+
+    def __init__(self, store: DiskCache = None, stage_cache: StageCache = None):
+        self.store = store or DiskCache("prewarm", ttl=365 * 24 * 3600, max_entries=10)
+        # Shares the live stage cache, marking what it stores as prewarmed.
+        self.stage_cache = stage_cache or StageCache(get_stage_cache().cache, source="prewarm")
+        self.config_path = os.getenv("PREWARM_CONFIG", "prewarm.json")
+        self.hours = parse_hours(os.getenv("PREWARM_HOURS", "2-6"))
+        self.max_targets = int(os.getenv("PREWARM_MAX_TARGETS", 20))
+        self.traffic_days = float(os.getenv("PREWARM_TRAFFIC_DAYS", 14))
+        self.min_requests = int(os.getenv("PREWARM_MIN_REQUESTS", 2))
+        # Upstream calls a single run may make, checked before every stage.
+        self.budget = {
+            "llm_call": int(os.getenv("PREWARM_MAX_LLM_CALLS", 300)),
+            "search_request": int(os.getenv("PREWARM_MAX_SEARCH_REQUESTS", 100)),
+            "scrape_request": int(os.getenv("PREWARM_MAX_SCRAPES", 50)),
+        }
+        # Counts of live requests not written to the store yet.
+        self._pending_traffic = {}
+        self._pending_live = Counter()
+        self._traffic_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._running = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -- traffic ----------------------------------------------------------
+
+    def record_request(self, inputs: dict):
+        """
+        Count a live request towards the traffic-derived targets. The count is
+        buffered in memory and written to the store by ``flush``.
+        """
+        now = time.time()
+        with self._traffic_lock:
+            for city in inputs["cities"].split(","):
+                if not city.strip():
+                    continue
+                target = {"origin": inputs["origin"], "city": city.strip(), "interests": inputs["interests"], "date_range": inputs["date_range"]}
+                entry = self._pending_traffic.setdefault(target_key(target), {"count": 0})
+                entry.update(target, count=entry["count"] + 1, last_seen=now)
+            full = len(self._pending_traffic) >= MAX_PENDING
+        if full:
+            self.flush()
+
+    def record_live(self, stages: dict):
+        """Count how the prewarmable stages of a live crew run were obtained."""
+        outcomes = [("city_research", outcome) for outcome in stages.get("city_research", {}).values()]
+        if "guide" in stages:
+            outcomes.append(("guide", stages["guide"]))
+        with self._traffic_lock:
+            for stage, outcome in outcomes:
+                self._pending_live[f"{stage}/{outcome}"] += 1
+        for stage, outcome in outcomes:
+            PREWARM_LIVE.inc(stage=stage, result=outcome)
+
+    def flush(self):
+        """Add the buffered traffic and live stage counts to the store."""
+        with self._flush_lock:
+            with self._traffic_lock:
+                pending, self._pending_traffic = self._pending_traffic, {}
+                live, self._pending_live = self._pending_live, Counter()
+            if pending:
+                now = time.time()
+                traffic = self.store.get("traffic") or {}
+                for key, update in pending.items():
+                    entry = traffic.setdefault(key, {"count": 0})
+                    entry.update(update, count=entry["count"] + update["count"])
+                cutoff = now - self.traffic_days * 24 * 3600
+                recent = sorted(
+                    ((key, entry) for key, entry in traffic.items() if entry["last_seen"] >= cutoff),
+                    key=lambda item: item[1]["count"],
+                    reverse=True,
+                )
+                self.store.set("traffic", dict(recent[:1000]))
+            if live:
+                self.store.set("live", dict(Counter(self.store.get("live") or {}) + live))
+
+    def configured_targets(self) -> list:
+        """
+        Targets of the config file: a list of ``origin``, ``city`` and
+        ``interests`` with either a ``date_range`` or a list of ``months``
+        (``YYYY-MM``).
+        """
+        if not os.path.exists(self.config_path):
+            return []
+        with open(self.config_path) as f:
+            entries = json.load(f)
+        targets = []
+        for entry in entries:
+            base = {"origin": entry["origin"], "city": entry["city"], "interests": entry["interests"]}
+            ranges = [month_range(month) for month in entry.get("months", [])] or [entry["date_range"]]
+            targets.extend({**base, "date_range": date_range} for date_range in ranges)
+        return targets
+
+    def targets(self) -> list:
+        """Configured targets first, then the most requested recent ones, up to ``max_targets``."""
+        self.flush()
+        traffic = self.store.get("traffic") or {}
+        cutoff = time.time() - self.traffic_days * 24 * 3600
+        popular = [
+            {name: entry[name] for name in ("origin", "city", "interests", "date_range")}
+            for entry in sorted(traffic.values(), key=lambda entry: entry["count"], reverse=True)
+            if entry["count"] >= self.min_requests and entry["last_seen"] >= cutoff
+        ]
+        targets = {}
+        for target in self.configured_targets() + popular:
+            targets.setdefault(target_key(target), target)
+        return list(targets.values())[:self.max_targets]
+
+    # -- running ----------------------------------------------------------
+
+    @property
+    def running(self) -> bool:
+        return self._running.locked()
+
+    def in_window(self, now: datetime = None) -> bool:
+        hour = (now or datetime.now()).hour
+        start, end = self.hours
+        return start <= hour < end if start <= end else hour >= start or hour < end
+
+    def over_budget(self, counter: EventCounter):
+        """Name of the first budget that is used up, or ``None``."""
+        for name, limit in self.budget.items():
+            if counter.counts[name] >= limit:
+                return name
+        return None
+
+    def warm(self, target: dict, counter: EventCounter) -> str:
+        """Run the research and guide stages of one target. Returns ``warmed`` or ``cached``."""
+        from main import TripCrew
+        from tasks.handoff import CityChoice
+        from tools.rate_limit import LOW, priority
+
+        city = target["city"]
+        crew = TripCrew(
+            origin=target["origin"],
+            cities=city,
+            interests=target["interests"],
+            date_range=target["date_range"],
+            stage_cache=self.stage_cache,
+        )
+        # Live requests always go first at the upstreams.
+        with bind(counter), priority(LOW):
+            crew.research_city(city)
+            if self.over_budget(counter) is None:
+                # The guide only sees the chosen city, so it can run without the planner.
+                choice = CityChoice(chosen_city=city, reason="", weather="", flight_cost="")
+                crew.city_guide(StageOutput(choice.model_dump_json(), choice))
+        outcomes = [crew.stage_report.get("city_research", {}).get(city), crew.stage_report.get("guide")]
+        return "warmed" if "ran" in outcomes else "cached"
+
+    def run(self, force: bool = False):
+        """
+        Prewarm every target until the budget is used or, unless ``force``d,
+        the off-peak window ends. Returns the run report, or ``None`` when a
+        run is already in progress.
+        """
+        if not self._running.acquire(blocking=False):
+            return None
+        try:
+            counter = EventCounter()
+            targets = self.targets()
+            report = {"started_at": time.time(), "targets": len(targets), "warmed": 0, "cached": 0, "failed": 0, "stopped": None}
+            for target in targets:
+                over = self.over_budget(counter)
+                if over is not None:
+                    report["stopped"] = f"{over} budget used"
+                elif not force and not self.in_window():
+                    report["stopped"] = "off-peak window ended"
+                elif self._stop.is_set():
+                    report["stopped"] = "shutdown"
+                if report["stopped"]:
+                    break
+                try:
+                    outcome = self.warm(target, counter)
+                except Exception as e:
+                    print(f"Prewarming {target['city']} for {target['date_range']} failed: {e}")
+                    outcome = "failed"
+                report[outcome] += 1
+                PREWARM_TARGETS.inc(result=outcome)
+            report["spend"] = {name: counter.counts[name] for name in self.budget}
+            report["finished_at"] = time.time()
+            self.store.set("last_run", report)
+            print(f"Prewarm run: {report}")
+            return report
+        finally:
+            self._running.release()
+
+    def start(self):
+        """Start the scheduler, which runs once a day inside the off-peak window."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._schedule, name="prewarm", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+    def _schedule(self):
+        while True:
+            self.flush()
+            last_run = self.store.get("last_run")
+            ran_today = last_run is not None and datetime.fromtimestamp(last_run["started_at"]).date() == datetime.now().date()
+            if self.in_window() and not ran_today:
+                self.run()
+            if self._stop.wait(SCHEDULE_POLL):
+                return
+
+    # -- reporting --------------------------------------------------------
+
+    def report(self) -> dict:
+        """The last run and the share of live stages served from prewarmed outputs, since the store was created."""
+        self.flush()
+        counts_by_stage = [tuple(key.split("/", 1)) + (n,) for key, n in (self.store.get("live") or {}).items()]
+        live = {}
+        for stage in LIVE_STAGES:
+            counts = {outcome: n for name, outcome, n in counts_by_stage if name == stage}
+            lookups = sum(counts.values())
+            live[stage] = {
+                **counts,
+                "lookups": lookups,
+                "hit_rate": counts.get("prewarmed", 0) / lookups if lookups else 0.0,
+            }
+        lookups = sum(n for _, _, n in counts_by_stage)
+        prewarmed = sum(n for _, outcome, n in counts_by_stage if outcome == "prewarmed")
+        return {
+            "hours": "-".join(str(hour) for hour in self.hours),
+            "budget": self.budget,
+            "targets": self.targets(),
+            "last_run": self.store.get("last_run"),
+            "live": live,
+            "hit_rate": prewarmed / lookups if lookups else 0.0,
+        }
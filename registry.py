@@ -0,0 +1,105 @@
+import threading
+import time
+
+from dotenv import load_dotenv
+import metrics
+from agents.cityexpert_agent import CityExpertAagent
+from agents.citypanner_agent import CityPannerAgent
+from agents.travel_concierge_agent import TravelConciergeAgent
+from tools.calculator_tool import CalculatorTools
+from tools.llm_cache import CachedLLM, llm_temperature
+from tools.rate_limit import llm_upstream
+from tools.webscraping_tool import WebScraper
+from tools.websearch_tool import Web_search
+
+
+DEFAULT_MODEL = "gemini/gemini-2.0-flash"
+
+AGENT_BUILDERS = {
+    "planner": (CityPannerAgent, ("scraper", "search")),
+    "guide": (CityExpertAagent, ("scraper", "search")),
+    "concierge": (TravelConciergeAgent, ("scraper", "search", "calculator")),
+}
+
+
+class ResourceRegistry:
+    """
+    Process level pool of LLM clients, tools and agent templates.
+
+    Everything is built once, either by ``warmup`` at startup or lazily on
+    first use, and each crew run gets cheap copies of the agent templates
+    instead of rebuilding the LLM, the tools and the agents every time.
+
+    Args:
+        api_keys (dict): Keys by upstream (``gemini``, ``serper``,
+            ``browserless``) for the clients and tools of this registry only.
+            Missing ones are read from the environment.
+    """
+
+    def __init__(self, model: str = DEFAULT_MODEL, api_keys: dict = None):
+        self.model = model
+        self.api_keys = api_keys or {}
+        self._lock = threading.RLock()
+        self._llms = {}
+        self._tools = None
+        self._templates = {}
+
+    def llm(self, stream: bool = False) -> CachedLLM:
+        with self._lock:
+            if stream not in self._llms:
+                self._llms[stream] = CachedLLM(
+                    model=self.model,
+                    stream=stream,
+                    temperature=llm_temperature(),
+                    api_key=self.api_keys.get(llm_upstream(self.model)),
+                )
+            return self._llms[stream]
+
+    def tools(self) -> dict:
+        # The tools keep no per-call state, so one instance of each is shared by every agent.
+        with self._lock:
+            if self._tools is None:
+                self._tools = {
+                    "scraper": WebScraper(api_key=self.api_keys.get("browserless"), llm_api_key=self.api_keys.get("gemini")),
+                    "search": Web_search(api_key=self.api_keys.get("serper")),
+                    "calculator": CalculatorTools(),
+                }
+            return self._tools
+
+    def agent(self, role: str, stream: bool = False):
+        """
+        Return a fresh copy of the agent template for ``role`` ("planner", "guide" or "concierge").
+        """
+        key = (role, stream)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is None:
+                builder, tool_names = AGENT_BUILDERS[role]
+                tools = self.tools()
+                template = builder(self.llm(stream), tools=[tools[name] for name in tool_names]).create_agent()
+                self._templates[key] = template
+        return template.copy()
+
+    def warmup(self, stream_variants=(False, True)) -> float:
+        """Build every LLM client, tool and agent template now. Returns the seconds spent."""
+        start = time.perf_counter()
+        for stream in stream_variants:
+            for role in AGENT_BUILDERS:
+                self.agent(role, stream)
+        return time.perf_counter() - start
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ResourceRegistry:
+    """Return the process wide registry, creating it on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            # API keys may only live in .env; load them before the first LLM client is built.
+            load_dotenv()
+            metrics.install_llm_callbacks()
+            _registry = ResourceRegistry()
+        return _registry
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import re
+
+from plan_cache import normalize_list
+from tools.cache import DiskCache
+
+
+# The inputs each stage actually uses, including the LLM model that wrote its
+# output. Upstream outputs enter a stage only
+# through its ``context`` (the compacted hand-off), which is what makes the
+# planner -> guide -> concierge chain a dependency graph: a stage is re-run
+# when its own inputs or the part of an upstream output it consumes change,
+# and reused otherwise.
+STAGE_INPUTS = {
+    "city_research": ("model", "origin", "city", "interests", "date_range"),
+    "destination_research": ("model", "city", "interests", "date_range"),
+    "flight_cost": ("model", "origin", "city", "date_range"),
+    "planner": ("model", "origin", "cities", "interests", "date_range"),
+    "guide": ("model", "origin", "interests", "context"),
+    "concierge": ("model", "origin", "interests", "date_range", "context"),
+}
+LIST_INPUTS = {"cities", "interests"}
+# The research of one city covers the weather, events and prices of the trip's
+# month, so requests for other days of the same month share it.
+MONTH_INPUTS = {stage: {"date_range"} for stage in ("city_research", "destination_research", "flight_cost")}
+
+
+def month_window(date_range: str) -> str:
+    """The month, or first and last month, of a date range such as ``2025-06-01 to 2025-06-10``."""
+    months = [f"{int(year):04d}-{int(month):02d}" for year, month in re.findall(r"(\d{4})-(\d{1,2})", date_range)]
+    if not months:
+        return " ".join(date_range.lower().split())
+    return months[0] if months[0] == months[-1] else f"{months[0]}..{months[-1]}"
+
+
+def stage_key(stage: str, inputs: dict) -> str:
+    """Key of a stage's output, built from normalized values of exactly the inputs it uses."""
+    values = {}
+    for name in STAGE_INPUTS[stage]:
+        value = inputs[name]
+        if name in LIST_INPUTS:
+            value = normalize_list(value)
+        elif name in MONTH_INPUTS.get(stage, ()):
+            value = month_window(value)
+        elif name != "context" or stage == "guide":
+            # The guide's context is only the chosen city, so its case and spacing do not matter.
+            value = " ".join(value.lower().split())
+        values[name] = value
+    raw = json.dumps([stage, values], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class StageOutput:
+    """
+    A stage output read back from the cache, shaped like crewAI's ``CrewOutput``.
+    ``source`` is ``"prewarm"`` when the background prewarming produced it.
+    """
+
+    def __init__(self, raw: str, pydantic=None, source: str = None):
+        self.raw = raw
+        self.pydantic = pydantic
+        self.source = source
+
+    def __str__(self):
+        return self.raw
+
+
+class StageCache:
+    """
+    Outputs of the individual crew stages keyed by the inputs of each stage.
+
+    A request that only changes the dates re-runs the planner and the
+    concierge but reuses the city guide when the same city is chosen, and
+    adding a candidate city only researches the new one.
+
+    Args:
+        source (str): Stored with every output this instance caches, e.g.
+            ``"prewarm"``, to tell live hits on those outputs apart.
+    """
+
+    def __init__(self, cache: DiskCache = None, source: str = None):
+        self.source = source
+        self.cache = cache or DiskCache(
+            "crew_stages",
+            ttl=float(os.getenv("STAGE_CACHE_TTL", 24 * 3600)),
+            max_entries=int(os.getenv("STAGE_CACHE_MAX_ENTRIES", 5000)),
+        )
+        self.enabled = os.getenv("STAGE_CACHE_ENABLED", "true").lower() == "true"
+
+    def get(self, stage: str, inputs: dict, model=None):
+        """
+        Return the cached output of ``stage`` for ``inputs``, or ``None``.
+
+        Args:
+            model: The Pydantic model of the stage's structured output, if it has one.
+        """
+        if not self.enabled:
+            return None
+        entry = self.cache.get(stage_key(stage, inputs))
+        if entry is None:
+            return None
+        pydantic = model.model_validate(entry["data"]) if model is not None and entry.get("data") else None
+        return StageOutput(entry["raw"], pydantic, entry.get("source"))
+
+    def set(self, stage: str, inputs: dict, output):
+        if not self.enabled:
+            return
+        pydantic = getattr(output, "pydantic", None)
+        self.cache.set(
+            stage_key(stage, inputs),
+            {
+                "raw": getattr(output, "raw", str(output)),
+                "data": pydantic.model_dump() if pydantic is not None else None,
+                "source": self.source,
+            },
+        )
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+_stage_cache = None
+
+
+def get_stage_cache() -> StageCache:
+    """Return the process wide stage cache, creating it on first use."""
+    global _stage_cache
+    if _stage_cache is None:
+        _stage_cache = StageCache()
+    return _stage_cache
@@ -1,10 +1,17 @@
 import streamlit as st
 from pydantic import BaseModel, Field
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import hashlib
+import json
 import os
 import datetime # Import the datetime module
+import threading
 
 # Assuming 'main' module and 'TripCrew' class exist in main.py
-from main import TripCrew
+from main import STAGES, TripCrew
+from events import CrewProgress, ProgressEmitter, bind
+from plan_cache import trip_key
 
 # Define the input schema (can be used for validation if needed, though Streamlit handles UI)
 class InputSchema(BaseModel):
@@ -14,6 +21,58 @@ class InputSchema(BaseModel):
     start_date: datetime.date = Field(..., description="The start date for the trip, e.g. '2023-01-01'")
     end_date: datetime.date = Field(..., description="The end date for the trip, e.g. '2023-12-31'")
 
+# Titles of the crew stages, shown as each one finishes
+STAGE_TITLES = {"planner": "City Selection", "guide": "City Guide", "concierge": "Itinerary"}
+
+
+# Streamlit re-executes this script on every interaction, so everything that
+# must outlive a rerun is kept in st.cache_resource (shared by all sessions)
+# or st.session_state (one per browser session).
+@st.cache_resource
+def get_executor():
+    """Background threads running the crews, so the script thread never blocks on a run."""
+    return ThreadPoolExecutor(max_workers=int(os.getenv("CREW_WORKERS", 2)), thread_name_prefix="crew")
+
+
+# Registries kept for the most recently used models and API keys
+MAX_REGISTRIES = int(os.getenv("STREAMLIT_MAX_REGISTRIES", 16))
+
+
+@st.cache_resource
+def get_registries():
+    """LLM clients, tools and agent templates per Gemini model and API keys, built once in the background."""
+    return {"lock": threading.Lock(), "registries": {}}
+
+
+def registry_for(resources, model, api_keys):
+    """
+    The registry of ``model`` using ``api_keys``. Every session passes its own
+    keys to its LLM clients and tools, so concurrent users never share keys.
+    """
+    from registry import ResourceRegistry
+
+    key = (model, hashlib.sha256(json.dumps(api_keys, sort_keys=True).encode()).hexdigest())
+    with resources["lock"]:
+        registries = resources["registries"]
+        registry = registries.pop(key, None) or ResourceRegistry(model=model, api_keys=api_keys)
+        registries[key] = registry
+        while len(registries) > MAX_REGISTRIES:
+            registries.pop(next(iter(registries)))
+        return registry
+
+
+def plan_in_background(inputs, model, api_keys, resources, emitter):
+    """Run the crew on the executor, reporting every finished task to ``emitter``."""
+    with bind(emitter):
+        # crewAI is imported here on first use, off the script thread.
+        registry = registry_for(resources, model, api_keys)
+        progress = CrewProgress(STAGES)
+        progress.started()
+        crew = TripCrew(**inputs, registry=registry)
+        output = crew.run_crew(step_callback=progress.step_callback, task_callback=progress.task_callback)
+        return {"trip_plan": str(output), "stages": crew.stage_report}
+
+
 st.set_page_config(page_title="AI Tourist Assistant")
 
 st.title("Welcome to AI Tourist Assistant")
@@ -87,6 +146,55 @@ start_date = st.date_input("Start Date", today, min_value=today)
 end_date = st.date_input("End Date", today + datetime.timedelta(days=7), min_value=start_date) # End date cannot be before start date
 
 
+# Plans of this session by request, so reruns show them instead of planning again
+plans = st.session_state.setdefault("plans", {})
+
+
+def start_run(inputs, model):
+    """Return the plan's key, submitting the crew unless the plan is known or already running."""
+    key = trip_key(inputs) + model
+    run = st.session_state.get("run")
+    if key in plans or (run is not None and run["key"] == key):
+        return key
+    # The keys go to this run's registry only, never to the process environment shared by all sessions.
+    api_keys = {"gemini": gemini_api_key, "browserless": browserless_api_key, "serper": serper_api_key}
+    emitter = ProgressEmitter()
+    future = get_executor().submit(
+        contextvars.copy_context().run, plan_in_background, inputs, model, api_keys, get_registries(), emitter
+    )
+    st.session_state.run = {"key": key, "future": future, "emitter": emitter, "stage": STAGES[0], "outputs": {}}
+    return key
+
+
+def show_outputs(outputs):
+    for stage in STAGES:
+        if stage in outputs:
+            with st.expander(STAGE_TITLES[stage], expanded=stage == "concierge"):
+                st.markdown(outputs[stage])
+
+
+@st.fragment(run_every=1.0)
+def show_run():
+    """Poll the running crew and render each task's output as soon as it finishes."""
+    run = st.session_state.get("run")
+    if run is None:
+        return
+    for event, data in run["emitter"].drain():
+        if event == "task_started":
+            run["stage"] = data["stage"]
+        elif event == "task_finished":
+            run["outputs"][data["stage"]] = data["output"]
+    if run["future"].done():
+        try:
+            plans[run["key"]] = {**run["future"].result(), "outputs": run["outputs"]}
+        except Exception as e:
+            st.session_state.run_error = str(e)
+        st.session_state.run = None
+        st.rerun()
+    st.info(f"Planning your trip... working on: {STAGE_TITLES.get(run['stage'], run['stage'])}")
+    show_outputs(run["outputs"])
+
+
 if st.button("Plan My Trip"):
     
     # Ensure end_date is not before start_date (this check is now partly handled by min_value)
@@ -101,24 +209,17 @@ if st.button("Plan My Trip"):
         if not all([origin, interests, cities, selected_gemini_model, gemini_api_key, browserless_api_key, serper_api_key]):
             st.error("Please fill in all the required fields, including all API Keys and Gemini Model in the sidebar.")
         else:
-            try:
-                with st.spinner("Planning your trip... This might take a moment."):
-                    crew = TripCrew(
-                        origin=origin,
-                        cities=cities,
-                        interests=interests,
-                        date_range=date_range, # Pass the combined date_range string
-                        gemini_model=str('gemini/'+selected_gemini_model)
-                    )
-
-                    output = crew.run_crew()
-
-                st.success("Trip Planning Complete!")
-                st.subheader("Your Trip Plan:")
-                
-                
-                st.markdown(output)
-
-               
-            except Exception as e:
-                st.error(f"An error occurred during trip planning: {e}")
\ No newline at end of file
+            inputs = {"origin": origin, "cities": cities, "interests": interests, "date_range": date_range}
+            st.session_state.run_error = None
+            st.session_state.current = start_run(inputs, str('gemini/'+selected_gemini_model))
+
+if st.session_state.get("current") in plans:
+    plan = plans[st.session_state.current]
+    st.success("Trip Planning Complete!")
+    st.subheader("Your Trip Plan:")
+    st.markdown(plan["trip_plan"])
+    show_outputs({stage: output for stage, output in plan["outputs"].items() if stage != "concierge"})
+elif st.session_state.get("run") is not None:
+    show_run()
+elif st.session_state.get("run_error"):
+    st.error(f"An error occurred during trip planning: {st.session_state.run_error}")
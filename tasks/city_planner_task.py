@@ -1,10 +1,11 @@
 from crewai import Task
 from textwrap import dedent
+from tasks.handoff import CityChoice
 
 
 class cityPlannerTask():
-    def __validate_inputs(self, origin, cities, interests, date_range):
-        if not origin or not cities or not interests or not date_range:
+    def __validate_inputs(self, *inputs):
+        if not all(inputs):
             raise ValueError("All input parameters must be provided")
         return True
 
@@ -21,12 +22,103 @@ class cityPlannerTask():
             Your final answer must be a detailed
             report on the chosen city, and everything you found out
             about it, including the actual flight costs, weather
-            forecast and attractions.
+            forecast and attractions, as a JSON object with the
+            fields chosen_city, reason, weather, flight_cost,
+            daily_cost, events and attractions.
 
             Traveling from: {origin}
             City Options: {cities}
             Trip Date: {range}
             Traveler Interests: {interests}
           """),
-            expected_output="A detailed report on the chosen city with flight costs, weather forecast, and attractions.",
-            agent=agent)
\ No newline at end of file
+            expected_output="A detailed report on the chosen city with flight costs, weather forecast, and attractions, as JSON.",
+            output_pydantic=CityChoice,
+            agent=agent)
+
+    def city_research_task(self, agent, origin, city, interests, range):
+        """Research a single candidate city so several cities can be researched in parallel."""
+        self.__validate_inputs(origin, city, interests, range)
+        return Task(description=dedent(f"""
+            Research {city} as a destination for this trip. Look up
+            the weather forecast for the trip dates, cultural or
+            seasonal events happening then, the actual flight cost
+            from {origin} and the typical daily cost of staying there.
+
+            Your final answer must be a compact summary of at most
+            150 words with one line each for weather, events, flight
+            cost, daily cost and the top attractions matching the
+            traveler interests.
+
+            Traveling from: {origin}
+            City: {city}
+            Trip Date: {range}
+            Traveler Interests: {interests}
+          """),
+            expected_output=f"A compact summary of {city} covering weather, events, flight cost, daily cost and top attractions.",
+            agent=agent)
+
+    def destination_research_task(self, agent, city, interests, range):
+        """Research a city without the flight cost, so travellers from every origin can share it."""
+        self.__validate_inputs(city, interests, range)
+        return Task(description=dedent(f"""
+            Research {city} as a destination for this trip. Look up
+            the weather forecast for the trip dates, cultural or
+            seasonal events happening then and the typical daily
+            cost of staying there. Do not look up flights.
+
+            Your final answer must be a compact summary of at most
+            130 words with one line each for weather, events, daily
+            cost and the top attractions matching the traveler
+            interests.
+
+            City: {city}
+            Trip Date: {range}
+            Traveler Interests: {interests}
+          """),
+            expected_output=f"A compact summary of {city} covering weather, events, daily cost and top attractions.",
+            agent=agent)
+
+    def flight_cost_task(self, agent, origin, city, range):
+        """Look up only the flight cost of one origin, the part of the city research that depends on it."""
+        self.__validate_inputs(origin, city, range)
+        return Task(description=dedent(f"""
+            Look up the actual round trip flight cost from {origin}
+            to {city} for the trip dates.
+
+            Your final answer must be a single line with the cheapest
+            typical fare and the currency, nothing else.
+
+            Traveling from: {origin}
+            City: {city}
+            Trip Date: {range}
+          """),
+            expected_output=f"One line with the flight cost from {origin} to {city}.",
+            agent=agent)
+
+    def ranking_task(self, agent, origin, city_summaries, interests, range):
+        """Pick the best city from the per-city research summaries."""
+        self.__validate_inputs(origin, city_summaries, interests, range)
+        research = "\n\n".join(f"{city}:\n{summary}" for city, summary in city_summaries.items())
+        return Task(description=dedent(f"""
+            Select the best city for the trip by comparing the
+            research below on weather, seasonal events, travel costs
+            and how well each city matches the traveler interests.
+            Only search for more information if something essential
+            is missing.
+
+            Your final answer must be a detailed report on the
+            chosen city, and everything found out about it,
+            including the actual flight costs, weather forecast and
+            attractions, and why it beat the other options, as a
+            JSON object with the fields chosen_city, reason,
+            weather, flight_cost, daily_cost, events and attractions.
+
+            Traveling from: {origin}
+            Trip Date: {range}
+            Traveler Interests: {interests}
+
+            City research:
+            """) + research,
+            expected_output="A detailed report on the chosen city with flight costs, weather forecast, and attractions, as JSON.",
+            output_pydantic=CityChoice,
+            agent=agent)
@@ -0,0 +1,93 @@
+import json
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class CityChoice(BaseModel):
+    """Structured output of the planner stage."""
+    chosen_city: str = Field(..., description="The city picked for the trip")
+    reason: str = Field(..., description="Why this city beat the other options")
+    weather: str = Field(..., description="Weather forecast for the trip dates")
+    flight_cost: str = Field(..., description="Actual round trip flight cost from the origin")
+    daily_cost: str = Field("", description="Typical daily cost of staying in the city")
+    events: list[str] = Field(default_factory=list, description="Cultural or seasonal events during the trip")
+    attractions: list[str] = Field(default_factory=list, description="Main attractions matching the traveler interests")
+
+
+class CityGuide(BaseModel):
+    """Structured output of the guide stage."""
+    city: str
+    attractions: list[str] = Field(default_factory=list, description="Must-visit landmarks and hidden gems")
+    food: list[str] = Field(default_factory=list, description="Restaurants, dishes and food spots worth a visit")
+    local_customs: list[str] = Field(default_factory=list, description="Customs and etiquette a visitor should know")
+    events: list[str] = Field(default_factory=list, description="Recurring festivals and events worth planning around")
+    practical_tips: list[str] = Field(default_factory=list, description="Transport, safety and money tips")
+    costs: str = Field("", description="High level costs of the trip")
+
+
+# Fields of each stage's output the next stage actually needs. The guide only
+# gets the city, so it does not depend on the trip dates and can be reused
+# when they change; the date specific weather and events go to the concierge.
+GUIDE_FIELDS = ("chosen_city",)
+CONCIERGE_CHOICE_FIELDS = ("chosen_city", "weather", "events", "flight_cost", "daily_cost")
+CONCIERGE_GUIDE_FIELDS = ("attractions", "food", "local_customs", "practical_tips", "costs")
+MAX_LIST_ITEMS = 8
+# Used when a stage did not return valid structured output.
+RAW_FALLBACK_CHARS = 2000
+
+
+def _pick(model: Optional[BaseModel], fields: tuple) -> dict:
+    data = model.model_dump() if model is not None else {}
+    picked = {}
+    for name in fields:
+        value = data.get(name)
+        if isinstance(value, list):
+            value = value[:MAX_LIST_ITEMS]
+        if value:
+            picked[name] = value
+    return picked
+
+
+def structured(output, model: type[BaseModel]) -> Optional[BaseModel]:
+    """Return the task output as ``model``, parsing the raw text if crewAI could not."""
+    if getattr(output, "pydantic", None) is not None:
+        return output.pydantic
+    raw = getattr(output, "raw", str(output))
+    start, end = raw.find("{"), raw.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        return model.model_validate_json(raw[start:end + 1])
+    except ValueError:
+        return None
+
+
+def compact_for_guide(choice_output) -> str:
+    """The planner output reduced to what the guide needs."""
+    choice = structured(choice_output, CityChoice)
+    if choice is None:
+        return getattr(choice_output, "raw", str(choice_output))[:RAW_FALLBACK_CHARS]
+    return json.dumps(_pick(choice, GUIDE_FIELDS), indent=1)
+
+
+def compact_for_concierge(choice_output, guide_output, omit: tuple = ()) -> str:
+    """The planner and guide outputs reduced to what the concierge needs, minus the ``omit`` fields."""
+    choice = structured(choice_output, CityChoice)
+    guide = structured(guide_output, CityGuide)
+    context = _pick(choice, tuple(name for name in CONCIERGE_CHOICE_FIELDS if name not in omit))
+    context.update(_pick(guide, CONCIERGE_GUIDE_FIELDS))
+    if choice is None:
+        context["planner_notes"] = getattr(choice_output, "raw", str(choice_output))[:RAW_FALLBACK_CHARS]
+    if guide is None:
+        context["guide_notes"] = getattr(guide_output, "raw", str(guide_output))[:RAW_FALLBACK_CHARS]
+    return json.dumps(context, indent=1)
+
+
+def count_tokens(text: str, model: str = "gemini/gemini-2.0-flash") -> int:
+    try:
+        import litellm
+
+        return litellm.token_counter(model=model, text=text)
+    except Exception:
+        return len(text) // 4
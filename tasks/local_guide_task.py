@@ -1,33 +1,36 @@
 from crewai import Task
 from textwrap import dedent
+from tasks.handoff import CityGuide
 
 
 class CityGuideTask():
 
-    def guide_task(self, agent, origin, interests, range):
-            
+    def guide_task(self, agent, origin, interests, context=None):
+            # Without an origin the guide can be shared by travellers from anywhere.
+            origin_line = f"Traveling from: {origin}" if origin else ""
             task=Task(description=dedent(f"""
                 As a local expert on this city you must compile an
                 in-depth guide for someone traveling there and wanting
                 to have THE BEST trip ever!
                 Gather information about  key attractions, local customs,
-                special events, and daily activity recommendations.
+                recurring festivals, and daily activity recommendations.
                 Find the best spots to go to, the kind of place only a
                 local would know.
                 This guide should provide a thorough overview of what
                 the city has to offer, including hidden gems, cultural
-                hotspots, must-visit landmarks, weather forecasts, and
-                high level costs.
+                hotspots, must-visit landmarks, and high level costs.
 
                 The final answer must be a comprehensive city guide,
                 rich in cultural insights and practical tips,
-                tailored to enhance the travel experience.
+                tailored to enhance the travel experience, as a JSON
+                object with the fields city, attractions, food,
+                local_customs, events, practical_tips and costs.
             
 
-                Trip Date: {range}
-                Traveling from: {origin}
+                {origin_line}
                 Traveler Interests: {interests}
-            """),
-                expected_output="A comprehensive city guide with cultural insights and practical tips.",
+            """) + (f"\nChosen city:\n{context}\n" if context else ""),
+                expected_output="A comprehensive city guide with cultural insights and practical tips, as JSON.",
+                output_pydantic=CityGuide,
                 agent=agent)
             return task  
\ No newline at end of file
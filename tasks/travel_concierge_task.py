@@ -6,7 +6,7 @@ class TravelConciergeTask():
    
     
 
-    def plan_task(self, agent, origin, interests, range):
+    def plan_task(self, agent, origin, interests, range, context=None):
         return Task(description=dedent(f"""
             Expand this guide into a full travel
             itinerary for this time {range} with detailed per-day plans, including
@@ -34,7 +34,7 @@ class TravelConciergeTask():
             Trip Date: {range}
             Traveling from: {origin}
             Traveler Interests: {interests}
-            """),
+            """) + (f"\nCity guide:\n{context}\n" if context else ""),
             expected_output="A complete travel plan, formatted as markdown, with a daily schedule and budget.",
             output_file='report.md',
             agent=agent)
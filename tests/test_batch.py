@@ -0,0 +1,98 @@
+import sys
+import threading
+import types
+
+import pytest
+
+import main
+from batch import BatchPlanner
+from events import ProgressEmitter, bind, emit
+
+
+class FakeCrew:
+    """Records every stage it runs; research and guides emit one ``llm_call`` each."""
+
+    runs = []
+    lock = threading.Lock()
+
+    def __init__(self, origin, cities, interests, date_range):
+        self.origin = origin
+        self.cities = cities
+        self.interests = interests
+        self.stage_report = {}
+
+    def _ran(self, stage, *args):
+        with self.lock:
+            self.runs.append((stage, self.origin, *args))
+        emit("llm_call")
+
+    def city_list(self):
+        return [city.strip() for city in self.cities.split(",")]
+
+    def research_cities(self, cities, research):
+        return {city: research(city) for city in cities}
+
+    def research_destination(self, city):
+        self._ran("destination_research", city, self.interests)
+        self.stage_report.setdefault("destination_research", {})[city] = "ran"
+        return f"{city} is sunny"
+
+    def flight_cost(self, city):
+        self._ran("flight_cost", city)
+        self.stage_report.setdefault("flight_cost", {})[city] = "ran"
+        return f"{self.origin}-{city}"
+
+    def plan_city(self, summaries):
+        self._ran("planner", self.interests, tuple(sorted(summaries.values())))
+        self.stage_report["planner"] = "ran"
+        return types.SimpleNamespace(chosen_city="Paris", raw="Paris")
+
+    def city_guide(self, choice):
+        self._ran("guide", choice.chosen_city, self.interests)
+        self.stage_report["guide"] = "ran"
+        return "guide"
+
+    def concierge_plan(self, choice, guide):
+        self.stage_report["concierge"] = "ran"
+        return f"plan for {self.origin}"
+
+
+@pytest.fixture
+def crews(monkeypatch):
+    FakeCrew.runs = []
+    monkeypatch.setattr(main, "TripCrew", FakeCrew)
+    monkeypatch.setitem(sys.modules, "tasks.handoff", types.SimpleNamespace(CityChoice=None, structured=lambda output, model: output))
+    return FakeCrew.runs
+
+
+def item(origin, interests):
+    return {"origin": origin, "cities": "Paris, London", "interests": interests, "date_range": "2025-09-10 to 2025-09-20"}
+
+
+def test_origins_share_destination_research_and_guide(crews):
+    emitter = ProgressEmitter()
+    with bind(emitter):
+        report = BatchPlanner(max_workers=3).run([item("Bengaluru", "food"), item("Delhi", "art"), item("Delhi", "food")])
+
+    stages = [run[0] for run in crews]
+    # One research per city and one guide for the whole group, whatever the origins.
+    assert stages.count("destination_research") == 2
+    assert stages.count("guide") == 1
+    # Flight costs once per origin and city, the planner once per traveller.
+    assert sorted(run[1:3] for run in crews if run[0] == "flight_cost") == [
+        ("Bengaluru", "London"), ("Bengaluru", "Paris"), ("Delhi", "London"), ("Delhi", "Paris"),
+    ]
+    assert stages.count("planner") == 3
+    assert {run[3] for run in crews if run[0] == "destination_research"} == {"food, art"}
+    # Each planner only sees its own origin's flights and its own interests.
+    planners = {(run[1], run[2]): run[3] for run in crews if run[0] == "planner"}
+    assert all(origin in summary for (origin, _), summaries in planners.items() for summary in summaries)
+
+    results = {data["index"]: data["stages"] for event, data in emitter.drain() if event == "item_result"}
+    assert len(results) == 3
+    guides = sorted(stages["guide"] for stages in results.values())
+    assert guides == ["ran", "shared", "shared"]
+    research = sorted(stages["destination_research"]["Paris"] for stages in results.values())
+    assert research == ["ran", "shared", "shared"]
+    # Both researches and the guide saved two travellers a call each, Delhi's two flight lookups one.
+    assert report["saved_llm_calls"] == 2 * 2 + 1 * 2 + 2 * 1
@@ -0,0 +1,39 @@
+import pytest
+
+from tools.calculator_tool import CalculatorTools, evaluate
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    [
+        ("max(100,250)", 250),
+        ("min(5,100)", 5),
+        ("1,200*3", 3600),
+        ("$1,234.50 + 10", 1244.5),
+    ],
+)
+def test_thousands_separators_and_function_arguments(expression, expected):
+    assert evaluate(expression) == expected
+
+
+def test_power_with_huge_result_is_rejected():
+    with pytest.raises(ValueError):
+        evaluate("(((9**99)**99)**99)**20")
+
+
+def test_result_too_large_to_format_is_reported_per_line():
+    output = CalculatorTools()._run(operations=["Hotel: 120*3", "Huge: (2**100)**40 * (2**100)**3"])
+    assert "Hotel = 360" in output
+    assert "Huge = Error" in output
+
+
+@pytest.mark.parametrize("expression", ["(-8)**0.5", "1e308*10", "1e308*10 - 1e308*10"])
+def test_complex_and_non_finite_results_are_rejected(expression):
+    with pytest.raises(ValueError):
+        evaluate(expression)
+
+
+def test_complex_result_is_reported_per_line():
+    output = CalculatorTools()._run(operations=["Hotel: 120*3", "Root: (-8)**0.5"])
+    assert "Root = Error: Result is not a real number" in output
+    assert "Total = 360" in output
@@ -0,0 +1,37 @@
+import random
+
+from tools.dedup import ChunkDeduplicator
+
+WORDS = "museum river cathedral market tram ticket hotel breakfast gallery festival bridge harbour".split()
+
+
+def text(seed):
+    rng = random.Random(seed)
+    return " ".join(f"{rng.choice(WORDS)}{rng.randint(0, 50)}" for _ in range(800))
+
+
+def edited(chunk, every):
+    words = chunk.split()
+    for i in range(0, len(words), every):
+        words[i] = "edited"
+    return " ".join(words)
+
+
+def chunk(deduplicator, text):
+    """Feed ``text`` as one whole chunk and return what was kept of it."""
+    return [kept.strip() for kept in deduplicator.add(text) + deduplicator.close()]
+
+
+def test_near_duplicate_chunks_are_dropped():
+    deduplicator = ChunkDeduplicator()
+    chunks = [text(seed) for seed in range(50)]
+    kept = [kept for page in chunks + [edited(chunks[10], 200), edited(chunks[40], 200)] for kept in chunk(deduplicator, page)]
+    assert kept == chunks
+    assert deduplicator.stats()["chunks_dropped"] == 2
+
+
+def test_distinct_chunks_are_kept():
+    deduplicator = ChunkDeduplicator()
+    for seed in range(200):
+        chunk(deduplicator, text(seed))
+    assert deduplicator.chunks_dropped == 0
@@ -0,0 +1,44 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+from tools.rate_limit import AdaptiveLimiter, Permit, SharedTokenBucket
+
+
+def test_async_acquire_does_not_block_loop_on_shared_bucket(tmp_path):
+    bucket = SharedTokenBucket("test", 100, path=str(tmp_path / "rate_limit.sqlite3"))
+    bucket.snapshot()
+    limiter = AdaptiveLimiter("test", 100, 2, 5.0, bucket=bucket)
+
+    async def main():
+        # Another process holds the write lock of the shared bucket for a while.
+        other = sqlite3.connect(bucket.path, isolation_level=None, check_same_thread=False)
+        other.execute("BEGIN IMMEDIATE")
+        threading.Timer(0.5, other.execute, ("COMMIT",)).start()
+        gaps = []
+
+        async def tick():
+            last = time.monotonic()
+            for _ in range(20):
+                await asyncio.sleep(0.01)
+                gaps.append(time.monotonic() - last)
+                last = time.monotonic()
+
+        await asyncio.gather(tick(), limiter.aacquire())
+        return max(gaps)
+
+    assert asyncio.run(main()) < 0.2
+    assert limiter.in_flight == 1
+
+
+def test_async_waiter_is_woken_by_thread_release():
+    limiter = AdaptiveLimiter("test", 100, 1, 5.0)
+    limiter.acquire()
+
+    async def main():
+        threading.Timer(0.1, limiter.release, (0.1, Permit())).start()
+        await asyncio.wait_for(limiter.aacquire(), 1.0)
+
+    asyncio.run(main())
+    assert limiter.stats()["waiting"] == 0
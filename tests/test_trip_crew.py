@@ -0,0 +1,69 @@
+import sys
+import types
+
+import pytest
+
+from main import TripCrew
+
+
+class FakeRegistry:
+    model = "gemini/test"
+
+    def llm(self, stream=False):
+        return None
+
+    def agent(self, role, stream=False):
+        return role
+
+
+class NoStageCache:
+    def get(self, stage, inputs, model=None):
+        return None
+
+    def set(self, stage, inputs, output):
+        pass
+
+
+@pytest.fixture
+def tasks(monkeypatch):
+    """Planner tasks that record how they were built instead of importing crewAI."""
+    built = []
+
+    class FakePlannerTask:
+        def ranking_task(self, agent, origin, summaries, interests, date_range):
+            built.append(("ranking", summaries))
+            return "ranking"
+
+        def planner_task(self, agent, origin, cities, interests, date_range):
+            built.append(("planner", cities))
+            return "planner"
+
+    monkeypatch.setitem(sys.modules, "tasks.city_planner_task", types.SimpleNamespace(cityPlannerTask=FakePlannerTask))
+    monkeypatch.setitem(sys.modules, "tasks.handoff", types.SimpleNamespace(CityChoice=None))
+    return built
+
+
+def make_crew(cities, fan_out=True):
+    crew = TripCrew("Bangalore", cities, "food", "2025-06-01 to 2025-06-10", fan_out=fan_out, registry=FakeRegistry(), stage_cache=NoStageCache())
+    crew.run_stage = lambda agent, task, step_callback=None, task_callback=None: f"ran {task}"
+    return crew
+
+
+def test_plan_city_ranks_given_summaries(tasks):
+    crew = make_crew("paris,london")
+    crew.research_cities = lambda cities: pytest.fail("summaries were given")
+    assert crew.plan_city(summaries={"paris": "sunny"}) == "ran ranking"
+    assert tasks == [("ranking", {"paris": "sunny"})]
+
+
+def test_plan_city_researches_candidates_itself(tasks):
+    crew = make_crew("paris,london")
+    crew.research_cities = lambda cities: {city: "researched" for city in cities}
+    assert crew.plan_city() == "ran ranking"
+    assert tasks == [("ranking", {"paris": "researched", "london": "researched"})]
+
+
+def test_plan_city_single_city_runs_planner_task(tasks):
+    crew = make_crew("paris")
+    assert crew.plan_city() == "ran planner"
+    assert tasks == [("planner", "paris")]
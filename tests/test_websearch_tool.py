@@ -0,0 +1,20 @@
+import pytest
+
+from tools.websearch_tool import Web_search
+
+
+def test_batched_answer_that_is_not_an_array_is_an_error():
+    with pytest.raises(ValueError, match="2 queries"):
+        Web_search()._parse_response({"message": "Not enough credits"}, ["paris weather", "paris events"], 4)
+
+
+def test_queries_missing_from_a_short_answer_get_no_results():
+    tool = Web_search()
+    answer = [{"organic": [{"title": "Weather", "link": "https://a", "snippet": "sunny"}]}]
+    parsed = tool._parse_response(answer, ["paris weather", "paris events"], 4)
+    assert parsed["paris events"] == []
+    assert "Title: Weather" in tool._format_results(parsed)
+
+
+def test_format_results_skips_queries_without_results():
+    assert Web_search()._format_results({"paris weather": None}) == ""
@@ -1,18 +1,207 @@
+import ast
+import math
+import operator
+import re
+from functools import lru_cache
+from typing import Optional
+
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
+from events import report_tool_call
+from metrics import traced_tool
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+FUNCTIONS = {
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+}
+MAX_EXPONENT = 100
+# Integer results are capped at about 1200 digits, well below the size that
+# makes big-int arithmetic slow or ``str`` refuse to convert the number.
+MAX_RESULT_BITS = 4096
+MAX_EXPRESSION_LENGTH = 500
+# "Day 1 hotel: 120*3" style lines carry a label before the expression.
+_THOUSANDS_RE = re.compile(r"(?<![\w.,])\d{1,3}(?:,\d{3})+(?:\.\d+)?(?![\w,])")
+_LABEL_RE = re.compile(r"^\s*([^:=]*[A-Za-z][^:=]*)\s*[:=]\s*(.+)$")
+
+
+def _compile_node(node):
+    """Turn a whitelisted AST node into a zero argument callable."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        value = node.value
+        return lambda: value
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        op = BINARY_OPERATORS[type(node.op)]
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        if op is operator.pow:
+            def power():
+                base, exponent = left(), right()
+                if abs(exponent) > MAX_EXPONENT:
+                    raise ValueError(f"Exponent {exponent} is too large")
+                # Checked before computing, since building the number is what takes the time and memory.
+                if isinstance(base, int) and exponent > 0 and abs(base).bit_length() * exponent > MAX_RESULT_BITS:
+                    raise ValueError("Result is too large")
+                return base ** exponent
+            return power
+        return lambda: op(left(), right())
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        op = UNARY_OPERATORS[type(node.op)]
+        operand = _compile_node(node.operand)
+        return lambda: op(operand())
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in FUNCTIONS
+        and not node.keywords
+    ):
+        func = FUNCTIONS[node.func.id]
+        args = [_compile_node(arg) for arg in node.args]
+        return lambda: func(*(arg() for arg in args))
+    raise ValueError(f"Unsupported element in expression: {ast.dump(node)[:60]}")
+
+
+def _strip_thousands_separators(expression: str) -> str:
+    """Turn "1,200" into "1200", except inside a call's arguments where the comma separates them."""
+    calls = []  # For every open parenthesis, whether it starts a function call.
+    parts = []
+    position = 0
+    for match in _THOUSANDS_RE.finditer(expression):
+        for index in range(position, match.start()):
+            if expression[index] == "(":
+                calls.append(bool(re.search(r"\w\s*$", expression[:index])))
+            elif expression[index] == ")" and calls:
+                calls.pop()
+        number = match.group()
+        parts.append(expression[position:match.start()])
+        parts.append(number if calls and calls[-1] else number.replace(",", ""))
+        position = match.end()
+    parts.append(expression[position:])
+    return "".join(parts)
+
+
+def normalize_expression(expression: str) -> str:
+    # Agents often send amounts as "1,200" or with a currency sign.
+    expression = _strip_thousands_separators(expression)
+    expression = re.sub(r"[$€£¥₹]", "", expression)
+    expression = re.sub(r"(?<=[\d)\s])[x×](?=[\s\d(])", "*", expression)
+    return " ".join(expression.replace("^", "**").split())
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(expression: str):
+    """
+    Parse and compile an arithmetic expression once.
+
+    Only numbers, the arithmetic operators and a few safe functions are
+    accepted; anything else raises ``ValueError``.
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError("Expression is too long")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression '{expression}': {e.msg}")
+    return _compile_node(tree.body)
+
+
+def evaluate(expression: str) -> float:
+    value = compile_expression(normalize_expression(expression))()
+    # "(-8)**0.5" is a complex number and "1e308*10" overflows to inf; neither is an amount.
+    if isinstance(value, complex):
+        raise ValueError("Result is not a real number")
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError("Result is too large or not a number")
+    if isinstance(value, int) and value.bit_length() > MAX_RESULT_BITS:
+        raise ValueError("Result is too large")
+    return value
+
+
+def split_label(line: str) -> tuple:
+    match = _LABEL_RE.match(line)
+    if match:
+        return match.group(1).strip(), match.group(2)
+    return line.strip(), line
+
 
 class CalculationInput(BaseModel):
-    operation: str = Field(..., description="The mathematical expression to evaluate")
+    operation: Optional[str] = Field(
+        None,
+        description="The mathematical expression to evaluate. Several expressions can be sent "
+        "at once, one per line, optionally labelled like 'Day 1 hotel: 120*3'",
+    )
+    operations: Optional[list[str]] = Field(
+        None, description="A list of expressions to evaluate in a single call, e.g. the per-day budget lines"
+    )
+    inr_rate: Optional[float] = Field(
+        None, description="Exchange rate to Indian Rupees; when given every result is also converted to Rupees"
+    )
+
 
 class CalculatorTools(BaseTool):
     name: str = "Make a calculation"
-    description: str = """Useful to perform any mathematical calculations, 
+    description: str = """Useful to perform any mathematical calculations,
     like sum, minus, multiplication, division, etc.
-    The input should be a mathematical expression, e.g. '200*7' or '5000/2*10'"""
+    The input should be a mathematical expression, e.g. '200*7' or '5000/2*10'.
+    To save round trips send all budget lines at once, one per line or as a list,
+    optionally with 'inr_rate' to also get every amount in Rupees."""
     args_schema: type[BaseModel] = CalculationInput
 
-    def _run(self, operation: str) -> float:
-        return eval(operation)
+    @traced_tool
+    @report_tool_call
+    def _run(self, operation: str = None, operations: list[str] = None, inr_rate: float = None):
+        lines = list(operations or [])
+        if operation:
+            lines.extend(line for line in re.split(r"[\n;]", operation) if line.strip())
+        if not lines:
+            return "Error: No expression given"
+
+        if len(lines) == 1 and inr_rate is None:
+            try:
+                return evaluate(split_label(lines[0])[1])
+            except (ValueError, ArithmeticError, TypeError) as e:
+                return f"Error: {str(e)}"
+
+        results = []
+        total = 0.0
+        for line in lines:
+            label, expression = split_label(line)
+            try:
+                value = evaluate(expression)
+                text = self._format(label, value, inr_rate)
+                total += value
+            except (ValueError, ArithmeticError, TypeError) as e:
+                results.append(f"{label} = Error: {str(e)}")
+                continue
+            results.append(text)
+        try:
+            if not math.isfinite(total):
+                raise ValueError("Total is too large")
+            results.append(self._format("Total", total, inr_rate))
+        except (ValueError, ArithmeticError) as e:
+            results.append(f"Total = Error: {str(e)}")
+        return "\n".join(results)
+
+    def _format(self, label: str, value: float, inr_rate: float = None) -> str:
+        text = f"{label} = {round(value, 2):,}"
+        if inr_rate is not None:
+            text += f" (₹{round(value * inr_rate, 2):,})"
+        return text
 
-    async def _arun(self, operation: str) -> float:
-        raise NotImplementedError("Async not implemented")
\ No newline at end of file
+    async def _arun(self, operation: str = None, operations: list[str] = None, inr_rate: float = None):
+        # Evaluating an expression is pure CPU work that finishes in microseconds,
+        # so there is nothing to await.
+        return self._run(operation, operations, inr_rate)
@@ -0,0 +1,162 @@
+import hashlib
+import re
+import struct
+
+
+CHUNK_SIZE = 8000
+# Rough characters-per-token ratio used to report the token savings.
+CHARS_PER_TOKEN = 4
+# Shorter elements such as table cells, prices or list items are kept even
+# when repeated: "€120" twice on a page is two facts, not boilerplate.
+MIN_REPEAT_CHARS = 40
+
+# One 64 byte blake2b digest per shingle gives the 32 16-bit hash values of
+# the signature, so a chunk costs one hash call per shingle and no big
+# integer arithmetic.
+_NUM_PERM = 32
+_HASH_VALUES = struct.Struct(f"<{_NUM_PERM}H")
+# Signatures are indexed by 16 bands of 2 values and only chunks sharing a
+# band are compared; chunks at a similarity of 0.8 almost always share one.
+_BANDS = 16
+_ROWS = _NUM_PERM // _BANDS
+_SHINGLE_SIZE = 5
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def shingles(text: str, size: int = _SHINGLE_SIZE) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(text: str) -> tuple:
+    """
+    Compute a MinHash signature of the word shingles of ``text``.
+    """
+    hashes = [
+        _HASH_VALUES.unpack(hashlib.blake2b(s.encode(), digest_size=_HASH_VALUES.size).digest())
+        for s in shingles(text)
+    ]
+    if not hashes:
+        return ()
+    return tuple(map(min, zip(*hashes)))
+
+
+def bands(signature: tuple) -> list:
+    """The LSH bands of ``signature``, keyed by their position."""
+    return [(i, signature[i * _ROWS:(i + 1) * _ROWS]) for i in range(_BANDS)] if signature else []
+
+
+def similarity(sig_a: tuple, sig_b: tuple) -> float:
+    """Estimate the Jaccard similarity of two MinHash signatures."""
+    if not sig_a or not sig_b:
+        return 0.0
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+
+class ChunkDeduplicator:
+    """
+    Streaming version of ``deduplicate``.
+
+    Elements are added one at a time and every chunk is returned as soon as
+    it is complete and known not to be a near duplicate, so the caller can
+    start working on the first chunks before the page has been read in full.
+    The chunks are the same as those of ``deduplicate`` on the whole page.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, threshold: float = 0.8):
+        self.chunk_size = chunk_size
+        self.threshold = threshold
+        self._seen = set()
+        self._signatures = []
+        # Indices of the kept signatures by band, to find the candidate duplicates.
+        self._bands = {}
+        self._pending = ""
+        self._kept_any = False
+        self.elements = 0
+        self.elements_dropped = 0
+        self.chunks = 0
+        self.chunks_dropped = 0
+        self.original_chars = 0
+        self.kept_chars = 0
+
+    def add(self, element) -> list:
+        """Add one page element and return the chunks completed by it."""
+        text = str(element)
+        self.original_chars += len(text) + (2 if self.elements else 0)
+        self.elements += 1
+        text = text.strip()
+        if not text:
+            self.elements_dropped += 1
+            return []
+        # Repeated navigation links, cookie banners and footers are emitted
+        # once per occurrence; only the first one is kept.
+        if len(text) >= MIN_REPEAT_CHARS:
+            key = hashlib.blake2b(normalize_text(text).encode(), digest_size=16).digest()
+            if key in self._seen:
+                self.elements_dropped += 1
+                return []
+            self._seen.add(key)
+        self._pending += ("\n\n" if self._kept_any else "") + text
+        self._kept_any = True
+        chunks = []
+        while len(self._pending) >= self.chunk_size:
+            chunks.extend(self._emit(self._pending[:self.chunk_size]))
+            self._pending = self._pending[self.chunk_size:]
+        return chunks
+
+    def close(self) -> list:
+        """Return the last, partial chunk if it is not a near duplicate."""
+        pending, self._pending = self._pending, ""
+        return self._emit(pending) if pending else []
+
+    def _emit(self, chunk: str) -> list:
+        self.chunks += 1
+        signature = minhash(chunk)
+        keys = bands(signature)
+        candidates = {index for key in keys for index in self._bands.get(key, ())}
+        if any(similarity(signature, self._signatures[index]) >= self.threshold for index in candidates):
+            self.chunks_dropped += 1
+            return []
+        for key in keys:
+            self._bands.setdefault(key, []).append(len(self._signatures))
+        self._signatures.append(signature)
+        self.kept_chars += len(chunk)
+        return [chunk]
+
+    def stats(self) -> dict:
+        chars_saved = self.original_chars - self.kept_chars
+        return {
+            "elements_dropped": self.elements_dropped,
+            "chunks_dropped": self.chunks_dropped,
+            "chunks_before": -(-self.original_chars // self.chunk_size),
+            "chunks_after": self.chunks - self.chunks_dropped,
+            "chars_saved": chars_saved,
+            "tokens_saved": chars_saved // CHARS_PER_TOKEN,
+        }
+
+
+def deduplicate(elements, chunk_size: int = CHUNK_SIZE, threshold: float = 0.8):
+    """
+    Remove repeated elements of at least ``MIN_REPEAT_CHARS`` characters and
+    near-duplicate chunks from partitioned page content.
+
+    Args:
+        elements: The elements returned by the HTML partitioner.
+        chunk_size (int): The number of characters per chunk.
+        threshold (float): Estimated Jaccard similarity above which a chunk is dropped.
+
+    Returns:
+        tuple: The list of chunks to summarize and a dict with the savings.
+    """
+    deduplicator = ChunkDeduplicator(chunk_size, threshold)
+    chunks = []
+    for element in elements:
+        chunks.extend(deduplicator.add(element))
+    chunks.extend(deduplicator.close())
+    return chunks, deduplicator.stats()
@@ -0,0 +1,173 @@
+import os
+from html.parser import HTMLParser
+
+
+# Subtrees whose text is never part of the main content of a page.
+SKIP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe",
+    "nav", "header", "footer", "aside", "form", "button", "select", "head",
+}
+# Tags that end the current block of text.
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "table", "tr",
+    "td", "th", "h1", "h2", "h3", "h4", "h5", "h6", "br", "hr", "blockquote",
+    "pre", "dl", "dt", "dd", "figcaption", "title", "body", "html",
+}
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+    "meta", "param", "source", "track", "wbr",
+}
+
+
+class MainContentExtractor(HTMLParser):
+    """
+    Incremental HTML to text extractor.
+
+    Text is collected per block element while script, style, navigation and
+    other chrome subtrees are skipped entirely. HTML can be fed in pieces with
+    ``feed`` and the completed blocks are returned as soon as they close, so
+    the extractor never needs the whole document in memory.
+    """
+
+    def __init__(self, min_block_chars: int = 2):
+        super().__init__(convert_charrefs=True)
+        self.min_block_chars = min_block_chars
+        self._skip_tag = None
+        self._skip_depth = 0
+        self._buffer = []
+        self._blocks = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag == "br":
+                self._flush()
+            return
+        if self._skip_tag is not None:
+            # Only the skipped tag is counted, unclosed tags inside it cannot
+            # leave the extractor stuck in skip mode.
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        if tag in SKIP_TAGS:
+            self._flush()
+            self._skip_tag = tag
+            self._skip_depth = 1
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == "br":
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if not self._skip_depth:
+                    self._skip_tag = None
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._skip_tag is None:
+            self._buffer.append(data)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        text = " ".join("".join(self._buffer).split())
+        self._buffer = []
+        if len(text) >= self.min_block_chars:
+            self._blocks.append(text)
+
+    def feed(self, data: str) -> list:
+        """Feed a piece of HTML and return the blocks completed so far."""
+        super().feed(data)
+        blocks, self._blocks = self._blocks, []
+        return blocks
+
+    def close(self) -> list:
+        """Finish parsing and return the remaining blocks."""
+        super().close()
+        self._flush()
+        blocks, self._blocks = self._blocks, []
+        return blocks
+
+
+def extract_fast(html: str) -> list:
+    extractor = MainContentExtractor()
+    return extractor.feed(html) + extractor.close()
+
+
+def extract_unstructured(html: str) -> list:
+    from unstructured.partition.html import partition_html
+
+    return [str(el) for el in partition_html(text=html)]
+
+
+BACKENDS = {
+    "fast": extract_fast,
+    "unstructured": extract_unstructured,
+}
+
+
+class BufferedExtractor:
+    """
+    ``feed`` / ``close`` wrapper for backends that need the whole page at once.
+    """
+
+    def __init__(self, extract):
+        self.extract = extract
+        self._pieces = []
+
+    def feed(self, data: str) -> list:
+        self._pieces.append(data)
+        return []
+
+    def close(self) -> list:
+        html, self._pieces = "".join(self._pieces), []
+        return self.extract(html)
+
+
+def _backend(backend: str = None) -> str:
+    backend = backend or os.getenv("SCRAPER_EXTRACTOR", "fast")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown extraction backend '{backend}', expected one of {sorted(BACKENDS)}")
+    if backend == "unstructured":
+        try:
+            import unstructured  # noqa: F401
+        except ImportError:
+            print("unstructured is not installed, falling back to the fast HTML extractor")
+            return "fast"
+    return backend
+
+
+def streaming_extractor(backend: str = None):
+    """
+    Return an extractor that takes the page in pieces through ``feed`` / ``close``.
+
+    Only the ``fast`` backend actually streams; ``unstructured`` buffers the
+    page and extracts it on ``close``.
+    """
+    if _backend(backend) == "fast":
+        return MainContentExtractor()
+    return BufferedExtractor(extract_unstructured)
+
+
+def extract_elements(html: str, backend: str = None) -> list:
+    """
+    Extract the text blocks of an HTML page.
+
+    Args:
+        html (str): The page HTML.
+        backend (str): ``"fast"`` or ``"unstructured"``. Defaults to the
+            ``SCRAPER_EXTRACTOR`` environment variable, then ``"fast"``.
+
+    Returns:
+        list: The text of each extracted element, in document order.
+    """
+    return BACKENDS[_backend(backend)](html)
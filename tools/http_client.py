@@ -0,0 +1,309 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from tools.rate_limit import alimited, limited
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class EndpointStats:
+    """Latency and error counters for one logical endpoint."""
+
+    def __init__(self, endpoint: str, window: int = 1000):
+        self.endpoint = endpoint
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.total = 0.0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, latency: float, ok: bool):
+        metrics.HTTP_SECONDS.observe(latency, endpoint=self.endpoint, ok=ok)
+        self.count += 1
+        self.total += latency
+        self.latencies.append(latency)
+        if not ok:
+            self.errors += 1
+
+    def summary(self) -> dict:
+        ordered = sorted(self.latencies)
+
+        def percentile(p):
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "mean_s": self.total / self.count if self.count else 0.0,
+            "p50_s": percentile(0.50),
+            "p95_s": percentile(0.95),
+            "max_s": ordered[-1] if ordered else 0.0,
+        }
+
+
+class LatencyRegistry:
+    """Per-endpoint statistics shared by the sync and async clients."""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> EndpointStats:
+        with self._lock:
+            if endpoint not in self._stats:
+                self._stats[endpoint] = EndpointStats(endpoint)
+            return self._stats[endpoint]
+
+    def summary(self) -> dict:
+        with self._lock:
+            items = list(self._stats.items())
+        return {endpoint: stats.summary() for endpoint, stats in items}
+
+
+latency_stats = LatencyRegistry()
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: str = None) -> float:
+    """Seconds to wait before retry number ``attempt`` (full jitter)."""
+    if retry_after:
+        try:
+            return min(float(retry_after), cap)
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class HttpClient:
+    """
+    Shared HTTP client for the tools.
+
+    Wraps a single ``requests.Session`` so connections are kept alive and
+    reused, caps the number of pooled connections per host, applies connect
+    and read timeouts to every call, and retries 429/5xx responses and
+    connection errors with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        max_connections_per_host: int = 10,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=max_connections_per_host,
+            pool_block=True,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def backoff(self, attempt: int, retry_after: str = None) -> float:
+        return backoff_delay(attempt, self.backoff_base, self.backoff_max, retry_after)
+
+    def request(self, method: str, url: str, endpoint: str = None, upstream: str = None, api_key: str = None, **kwargs) -> requests.Response:
+        """
+        Send a request, retrying throttled and failed calls.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to call.
+            endpoint (str): Label used for the latency statistics. Defaults to the host.
+            upstream (str): Every attempt waits for this upstream's rate limiter, if given.
+            api_key (str): The key the call is made with; every key has its own limiter.
+            **kwargs: Passed through to ``requests.Session.request``.
+
+        Returns:
+            requests.Response: The last response received.
+        """
+        endpoint = endpoint or requests.utils.urlparse(url).netloc
+        stats = latency_stats.get(endpoint)
+        kwargs.setdefault("timeout", self.timeout)
+
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                with limited(upstream, api_key) as permit:
+                    response = self.session.request(method, url, **kwargs)
+                    if response.status_code == 429:
+                        permit.throttle(response.headers.get("Retry-After"))
+            except (requests.ConnectionError, requests.Timeout):
+                stats.record(time.perf_counter() - start, ok=False)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+            else:
+                ok = response.status_code < 400
+                stats.record(time.perf_counter() - start, ok=ok)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                delay = self.backoff(attempt, response.headers.get("Retry-After"))
+                response.close()
+            stats.retries += 1
+            attempt += 1
+            time.sleep(delay)
+
+    def post(self, url: str, endpoint: str = None, **kwargs) -> requests.Response:
+        return self.request("POST", url, endpoint=endpoint, **kwargs)
+
+    def get(self, url: str, endpoint: str = None, **kwargs) -> requests.Response:
+        return self.request("GET", url, endpoint=endpoint, **kwargs)
+
+    def stats(self) -> dict:
+        return latency_stats.summary()
+
+
+class AsyncHttpClient:
+    """
+    Non-blocking counterpart of ``HttpClient`` built on ``httpx.AsyncClient``.
+
+    Uses the same timeouts, retry policy and latency statistics so the async
+    tool paths behave exactly like the sync ones.
+    """
+
+    def __init__(
+        self,
+        max_connections_per_host: int = 10,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+    ):
+        import httpx
+
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=max_connections_per_host),
+        )
+        # httpx has no per-host pool limit, so each host gets its own semaphore.
+        self._max_per_host = max_connections_per_host
+        self._host_limits = {}
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = requests.utils.urlparse(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self._max_per_host)
+        return self._host_limits[host]
+
+    async def request(self, method: str, url: str, endpoint: str = None, upstream: str = None, api_key: str = None, **kwargs):
+        """
+        Send a request, retrying throttled and failed calls.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to call.
+            endpoint (str): Label used for the latency statistics. Defaults to the host.
+            upstream (str): Every attempt waits for this upstream's rate limiter, if given.
+            api_key (str): The key the call is made with; every key has its own limiter.
+            stream (bool): Return as soon as the headers arrive and leave the
+                body to ``aiter_bytes``; the caller must ``aclose`` the response.
+            **kwargs: Passed through to ``httpx.AsyncClient.request``.
+
+        Returns:
+            httpx.Response: The last response received.
+        """
+        import httpx
+
+        endpoint = endpoint or requests.utils.urlparse(url).netloc
+        stats = latency_stats.get(endpoint)
+        limit = self._host_limit(url)
+        stream = kwargs.pop("stream", False)
+
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                async with alimited(upstream, api_key) as permit, limit:
+                    request = self.client.build_request(method, url, **kwargs)
+                    response = await self.client.send(request, stream=stream)
+                    if response.status_code == 429:
+                        permit.throttle(response.headers.get("Retry-After"))
+            except (httpx.TransportError, httpx.TimeoutException):
+                stats.record(time.perf_counter() - start, ok=False)
+                if attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+            else:
+                stats.record(time.perf_counter() - start, ok=response.status_code < 400)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max, response.headers.get("Retry-After"))
+                await response.aclose()
+            stats.retries += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def post(self, url: str, endpoint: str = None, **kwargs):
+        return await self.request("POST", url, endpoint=endpoint, **kwargs)
+
+    async def get(self, url: str, endpoint: str = None, **kwargs):
+        return await self.request("GET", url, endpoint=endpoint, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def _client_settings() -> dict:
+    return {
+        "max_connections_per_host": int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", 10)),
+        "connect_timeout": float(os.getenv("HTTP_CONNECT_TIMEOUT", 5)),
+        "read_timeout": float(os.getenv("HTTP_READ_TIMEOUT", 60)),
+        "max_retries": int(os.getenv("HTTP_MAX_RETRIES", 3)),
+    }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Return the process wide HTTP client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(**_client_settings())
+        return _client
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_http_client() -> AsyncHttpClient:
+    """
+    Return the async HTTP client of the running event loop.
+
+    httpx connections are bound to the loop they were opened on, so one
+    client is kept per loop and dropped together with it.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncHttpClient(**_client_settings())
+        _async_clients[loop] = client
+    return client
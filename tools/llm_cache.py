@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+
+from crewai import LLM
+from events import emit
+from tools.cache import DiskCache
+from tools.rate_limit import alimited, is_rate_limited, limited, llm_upstream
+
+_llm_cache = None
+
+
+def get_llm_cache() -> DiskCache:
+    """Return the process wide cache of LLM completions, creating it on first use."""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = DiskCache(
+            "llm",
+            ttl=float(os.getenv("LLM_CACHE_TTL", 24 * 3600)),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 5000)),
+        )
+    return _llm_cache
+
+
+def normalize_messages(messages) -> list:
+    """
+    Reduce messages to their role and whitespace-normalized content, so
+    prompts that only differ in formatting share a cache entry.
+    """
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    normalized = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            content = " ".join(content.split())
+        normalized.append({"role": message.get("role"), "content": content})
+    return normalized
+
+
+def llm_cache_key(model: str, messages, temperature=None, tools=None, stop=None) -> str:
+    raw = json.dumps(
+        [model, normalize_messages(messages), temperature, tools or [], sorted(stop or [])],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def llm_temperature() -> float:
+    """Sampling temperature of our LLM calls, ``LLM_TEMPERATURE`` (0 by default)."""
+    return float(os.getenv("LLM_TEMPERATURE", 0))
+
+
+def cacheable(temperature=None, n=None) -> bool:
+    """
+    Whether a completion with these settings may be answered from the cache.
+
+    Calls asking for several choices or sampling above ``LLM_CACHE_MAX_TEMPERATURE``
+    expect a different answer each time and always go to the model. So do
+    calls without a temperature, which sample at the provider's default
+    (1.0 for Gemini).
+    """
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() != "true":
+        return False
+    if n is not None and n > 1:
+        return False
+    return temperature is not None and temperature <= float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", 0))
+
+
+def _api_key(model: str, api_key: str = None) -> str:
+    return api_key or os.getenv(f"{llm_upstream(model).upper()}_API_KEY")
+
+
+class CachedLLM(LLM):
+    """
+    crewAI ``LLM`` that answers repeated prompts from the on-disk LLM cache.
+
+    The key covers the model, the normalized messages, the temperature, the
+    stop words and the tool schema; only plain text answers are stored, and
+    calls that may run ``available_functions`` always go to the model. Every
+    call emits an ``llm_call`` progress event telling whether it was cached,
+    and calls that reach the model wait for its upstream's rate limiter.
+    """
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        key = None
+        if not available_functions and cacheable(self.temperature, getattr(self, "n", None)):
+            key = llm_cache_key(self.model, messages, self.temperature, tools, self.stop)
+            cached = get_llm_cache().get(key)
+            if cached is not None:
+                emit("llm_call", model=self.model, cached=True)
+                return cached
+        emit("llm_call", model=self.model, cached=False)
+        with limited(llm_upstream(self.model), _api_key(self.model, self.api_key)) as permit:
+            try:
+                result = super().call(
+                    messages, tools=tools, callbacks=callbacks, available_functions=available_functions, **kwargs
+                )
+            except Exception as e:
+                if is_rate_limited(e):
+                    permit.throttle()
+                raise
+        if key is not None and isinstance(result, str) and result.strip():
+            get_llm_cache().set(key, result)
+        return result
+
+
+async def acompletion_text(model: str, messages: list, temperature=None, api_key: str = None) -> str:
+    """
+    ``litellm.acompletion`` behind the same cache, returning the message text.
+    ``api_key`` defaults to the model provider's key from the environment.
+    """
+    import litellm
+
+    key = None
+    if cacheable(temperature):
+        key = llm_cache_key(model, messages, temperature)
+        cached = get_llm_cache().get(key)
+        if cached is not None:
+            emit("llm_call", model=model, cached=True)
+            return cached
+    emit("llm_call", model=model, cached=False)
+    kwargs = {} if temperature is None else {"temperature": temperature}
+    if api_key:
+        kwargs["api_key"] = api_key
+    async with alimited(llm_upstream(model), _api_key(model, api_key)) as permit:
+        try:
+            response = await litellm.acompletion(model=model, messages=messages, **kwargs)
+        except Exception as e:
+            if is_rate_limited(e):
+                permit.throttle()
+            raise
+    text = str(response.choices[0].message.content)
+    if key is not None and text.strip():
+        get_llm_cache().set(key, text)
+    return text
@@ -0,0 +1,510 @@
+"""
+Shared rate limiting for the Gemini, Serper and Browserless calls.
+
+Every upstream and API key gets its own ``AdaptiveLimiter``. A token bucket
+caps the request rate, and the number of calls in flight adapts AIMD-style:
+it grows by about one per round of successful calls and halves on a 429 or
+when latency passes the upstream's target. Waiting calls are admitted by
+priority, so the final itinerary is not stuck behind background work such
+as page chunk summaries.
+
+The token bucket lives in SQLite under ``CACHE_DIR``, so the API process and
+the crew worker processes draw from one request budget per upstream and API
+key, and a 429 seen by one of them pauses all of them. The calls in flight
+are counted per process, so each process gets its share of the concurrency.
+"""
+import asyncio
+import contextvars
+import hashlib
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import metrics
+from tools.cache import CACHE_DIR
+
+
+HIGH, NORMAL, LOW = 0, 1, 2
+PRIORITY_NAMES = {HIGH: "high", NORMAL: "normal", LOW: "low"}
+
+# Requests per second, calls in flight and the latency (seconds) above which the upstream counts as overloaded.
+UPSTREAMS = {
+    "gemini": {"rate": 5.0, "max_concurrency": 8, "latency_target": 30.0},
+    "serper": {"rate": 5.0, "max_concurrency": 5, "latency_target": 5.0},
+    "browserless": {"rate": 2.0, "max_concurrency": 4, "latency_target": 30.0},
+}
+DEFAULT_UPSTREAM = {"rate": 5.0, "max_concurrency": 4, "latency_target": 30.0}
+
+# A burst of 429s from calls sent at the old limit only halves it once.
+DECREASE_COOLDOWN = 2.0
+RATE_LIMIT_WAIT = metrics.histogram("tour_planner_rate_limit_wait_seconds", "Time calls waited for the rate limiter")
+RATE_LIMIT_CONCURRENCY = metrics.gauge("tour_planner_rate_limit_concurrency", "Calls allowed in flight per upstream")
+RATE_LIMIT_THROTTLED = metrics.counter("tour_planner_rate_limit_throttled_total", "Calls the upstream answered with 429")
+
+_priority = contextvars.ContextVar("rate_limit_priority", default=NORMAL)
+
+
+@contextmanager
+def priority(level: int):
+    """Run the calls made in this block, and in contexts copied from it, at ``level``."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+def _refill(tokens: float, updated: float, paused_until: float, now: float, rate: float, burst: float) -> float:
+    """Tokens after refilling since ``updated``; nothing accrues while the bucket is paused."""
+    return min(burst, tokens + max(0.0, now - max(updated, paused_until)) * rate)
+
+
+def _take(state: dict, now: float, rate: float) -> float:
+    """Take a token from ``state`` and return 0, or return the seconds until one is free."""
+    if now < state["paused_until"]:
+        return state["paused_until"] - now
+    if state["tokens"] >= 1:
+        state["tokens"] -= 1
+        return 0.0
+    return (1 - state["tokens"]) / rate
+
+
+def _pause(state: dict, now: float, seconds: float):
+    """Send nothing for ``seconds``, then restart from an empty bucket."""
+    state["paused_until"] = max(state["paused_until"], now + seconds)
+    state["tokens"] = 0.0
+
+
+class TokenBucket:
+    """Request rate budget of one process allowing bursts of up to ``burst`` calls."""
+
+    # Updates are in memory, so the limiter calls it straight from the event loop.
+    blocking = False
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, 2 * rate)
+        self.state = {"tokens": self.burst, "paused_until": 0.0}
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        self.state["tokens"] = _refill(self.state["tokens"], self.updated, self.state["paused_until"], now, self.rate, self.burst)
+        self.updated = now
+        return now
+
+    def try_take(self) -> float:
+        """Take a token and return 0, or return the seconds until a call may be sent."""
+        with self._lock:
+            return _take(self.state, self._refill(), self.rate)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            _pause(self.state, self._refill(), seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = self._refill()
+            return {"tokens": round(self.state["tokens"], 2), "paused_s": round(max(0.0, self.state["paused_until"] - now), 2)}
+
+
+class SharedTokenBucket:
+    """
+    ``TokenBucket`` stored in SQLite and shared by every process using ``path``.
+
+    Each update runs in its own write transaction on wall clock time. When
+    the database cannot be used the process falls back to a local bucket
+    rather than failing the call.
+    """
+
+    # Every update is a SQLite write that may wait on other processes, so
+    # the limiter never calls it on the event loop or under its own lock.
+    blocking = True
+
+    def __init__(self, key: str, rate: float, burst: float = None, path: str = None):
+        self.key = key
+        self.rate = rate
+        self.burst = burst or max(1.0, 2 * rate)
+        self.path = path or os.path.join(CACHE_DIR, "rate_limit.sqlite3")
+        self._local = TokenBucket(rate, burst)
+        # One transaction at a time on the shared connection.
+        self._lock = threading.Lock()
+        self.__conn = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self.__conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " key TEXT PRIMARY KEY,"
+                " tokens REAL NOT NULL,"
+                " updated REAL NOT NULL,"
+                " paused_until REAL NOT NULL)"
+            )
+            self.__conn = conn
+        return self.__conn
+
+    def _update(self, change):
+        """Run ``change(state, now)`` on the refilled stored bucket in one transaction and return its result."""
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = conn.execute("SELECT tokens, updated, paused_until FROM buckets WHERE key = ?", (self.key,)).fetchone()
+                if row is None:
+                    state = {"tokens": self.burst, "paused_until": 0.0}
+                else:
+                    state = {"tokens": _refill(row[0], row[1], row[2], now, self.rate, self.burst), "paused_until": row[2]}
+                result = change(state, now)
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated, paused_until) VALUES (?, ?, ?, ?)",
+                    (self.key, state["tokens"], now, state["paused_until"]),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return result
+
+    def try_take(self) -> float:
+        try:
+            return self._update(lambda state, now: _take(state, now, self.rate))
+        except sqlite3.Error as e:
+            print(f"Shared rate limit bucket {self.key} unavailable, limiting this process only: {e}")
+            return self._local.try_take()
+
+    def pause(self, seconds: float):
+        try:
+            self._update(lambda state, now: _pause(state, now, seconds))
+        except sqlite3.Error as e:
+            print(f"Shared rate limit bucket {self.key} unavailable, pausing this process only: {e}")
+            self._local.pause(seconds)
+
+    def snapshot(self) -> dict:
+        try:
+            return self._update(lambda state, now: {
+                "tokens": round(state["tokens"], 2), "paused_s": round(max(0.0, state["paused_until"] - now), 2),
+            })
+        except sqlite3.Error:
+            return self._local.snapshot()
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Permit:
+    """An admitted call. Mark it ``throttle``d when the upstream answered 429."""
+
+    def __init__(self):
+        self.throttled = False
+        self.retry_after = None
+
+    def throttle(self, retry_after=None):
+        self.throttled = True
+        try:
+            self.retry_after = float(retry_after) if retry_after else None
+        except ValueError:
+            self.retry_after = None
+
+
+class AdaptiveLimiter:
+    """
+    Token bucket plus an AIMD concurrency limit with priority admission.
+
+    Args:
+        upstream (str): Upstream name, used for the metrics labels.
+        rate (float): Requests per second.
+        max_concurrency (int): Upper bound of the calls in flight.
+        latency_target (float): Seconds above which a successful call still
+            counts as a sign of overload.
+        bucket: ``TokenBucket`` or ``SharedTokenBucket`` of the request rate,
+            a process local bucket of ``rate`` by default.
+    """
+
+    def __init__(
+        self, upstream: str, rate: float, max_concurrency: int, latency_target: float, min_concurrency: int = 1, bucket=None,
+    ):
+        self.upstream = upstream
+        self.bucket = bucket or TokenBucket(rate)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_target = latency_target
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        # Whether the first in line is asking the bucket for a token, outside ``_cond``.
+        self._taking = False
+        # Futures of the async waiters, with their loops, woken with the threads.
+        self._async_waiters = []
+        self._last_decrease = 0.0
+        RATE_LIMIT_CONCURRENCY.set(self.limit, upstream=upstream)
+
+    def _claim(self, ticket: tuple) -> bool:
+        """
+        Called under ``_cond``: whether ``ticket`` is first in line with room
+        for one more call, in which case it gets the turn to take a token.
+        """
+        if self._taking or self._waiters[0] != ticket or self.in_flight >= int(self.limit):
+            return False
+        self._taking = True
+        return True
+
+    def _settle(self, ticket: tuple, wait) -> bool:
+        """Called under ``_cond``: hand back the turn and admit ``ticket`` when it got a token."""
+        self._taking = False
+        admitted = wait == 0
+        if admitted:
+            self._waiters.remove(ticket)
+            heapq.heapify(self._waiters)
+            self.in_flight += 1
+        # The next in line may fit as well.
+        self._notify()
+        return admitted
+
+    def _notify(self):
+        """Called under ``_cond``: wake every waiter to check whether it is its turn."""
+        self._cond.notify_all()
+        for loop, future in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # The waiter's loop has closed.
+                pass
+        self._async_waiters = []
+
+    def _withdraw(self, ticket: tuple):
+        with self._cond:
+            if ticket in self._waiters:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._notify()
+
+    def _observe_wait(self, start: float, level: int):
+        RATE_LIMIT_WAIT.observe(time.monotonic() - start, upstream=self.upstream, priority=PRIORITY_NAMES.get(level, level))
+
+    def acquire(self, level: int = None):
+        level = current_priority() if level is None else level
+        start = time.monotonic()
+        ticket = (level, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+        admitted = False
+        try:
+            while not admitted:
+                with self._cond:
+                    while not self._claim(ticket):
+                        self._cond.wait()
+                # The bucket may be shared through SQLite, so it is only
+                # asked once the lock is released.
+                wait = None
+                try:
+                    wait = self.bucket.try_take()
+                finally:
+                    with self._cond:
+                        admitted = self._settle(ticket, wait)
+                if not admitted:
+                    time.sleep(wait)
+        finally:
+            if not admitted:
+                self._withdraw(ticket)
+        self._observe_wait(start, level)
+
+    async def aacquire(self, level: int = None):
+        level = current_priority() if level is None else level
+        start = time.monotonic()
+        ticket = (level, next(self._seq))
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+        admitted = False
+        try:
+            while not admitted:
+                with self._cond:
+                    claimed = self._claim(ticket)
+                    if not claimed:
+                        woken = loop.create_future()
+                        self._async_waiters.append((loop, woken))
+                if not claimed:
+                    await woken
+                    continue
+                wait = None
+                try:
+                    wait = await self._call_bucket(self.bucket.try_take)
+                finally:
+                    with self._cond:
+                        admitted = self._settle(ticket, wait)
+                if not admitted:
+                    await asyncio.sleep(wait)
+        finally:
+            if not admitted:
+                self._withdraw(ticket)
+        self._observe_wait(start, level)
+
+    async def _call_bucket(self, call, *args):
+        """Run a bucket call off the event loop when it does disk I/O."""
+        if self.bucket.blocking:
+            return await asyncio.to_thread(call, *args)
+        return call(*args)
+
+    def _record(self, latency: float, permit: Permit):
+        """Adjust the concurrency limit to how the call went and let the next waiter in."""
+        now = time.monotonic()
+        with self._cond:
+            self.in_flight -= 1
+            self.calls += 1
+            if permit.throttled:
+                self.throttled += 1
+                RATE_LIMIT_THROTTLED.inc(upstream=self.upstream)
+                self._decrease(now)
+            elif latency > self.latency_target:
+                self._decrease(now)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            RATE_LIMIT_CONCURRENCY.set(round(self.limit, 2), upstream=self.upstream)
+            self._notify()
+
+    def release(self, latency: float, permit: Permit):
+        if permit.throttled:
+            # Everyone holds off, so retries do not arrive as a second burst.
+            self.bucket.pause(permit.retry_after or 1.0)
+        self._record(latency, permit)
+
+    async def arelease(self, latency: float, permit: Permit):
+        if permit.throttled:
+            await self._call_bucket(self.bucket.pause, permit.retry_after or 1.0)
+        self._record(latency, permit)
+
+    def _decrease(self, now: float):
+        if now - self._last_decrease >= DECREASE_COOLDOWN:
+            self.limit = max(float(self.min_concurrency), self.limit / 2)
+            self._last_decrease = now
+
+    @contextmanager
+    def slot(self, level: int = None):
+        self.acquire(level)
+        permit = Permit()
+        start = time.monotonic()
+        try:
+            yield permit
+        finally:
+            self.release(time.monotonic() - start, permit)
+
+    @asynccontextmanager
+    async def aslot(self, level: int = None):
+        await self.aacquire(level)
+        permit = Permit()
+        start = time.monotonic()
+        try:
+            yield permit
+        finally:
+            await self.arelease(time.monotonic() - start, permit)
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiters),
+                "calls": self.calls,
+                "throttled": self.throttled,
+            }
+        stats["bucket"] = self.bucket.snapshot()
+        return stats
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def sharing_processes() -> int:
+    """Processes sending calls with the same keys: the crew workers and the API process in process mode."""
+    if os.getenv("CREW_EXECUTION", "thread").lower() != "process":
+        return 1
+    return int(os.getenv("CREW_PROCESSES", os.cpu_count() or 1)) + 1
+
+
+def get_limiter(upstream: str, api_key: str = None):
+    """
+    Return the process wide limiter of ``upstream`` and ``api_key``, or ``None``
+    when there is no upstream or ``RATE_LIMIT_ENABLED`` is false.
+
+    Rates and concurrency come from ``<UPSTREAM>_RATE_LIMIT`` and
+    ``<UPSTREAM>_MAX_CONCURRENCY``; every API key gets the full quota. The
+    rate is shared by all processes unless ``RATE_LIMIT_SHARED`` is false,
+    and the concurrency is split between them.
+    """
+    if not upstream or os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "true":
+        return None
+    key = (upstream, hashlib.sha256(api_key.encode()).hexdigest()[:12] if api_key else "")
+    with _limiters_lock:
+        if key not in _limiters:
+            config = UPSTREAMS.get(upstream, DEFAULT_UPSTREAM)
+            prefix = upstream.upper()
+            rate = float(os.getenv(f"{prefix}_RATE_LIMIT", config["rate"]))
+            max_concurrency = int(os.getenv(f"{prefix}_MAX_CONCURRENCY", config["max_concurrency"]))
+            shared = os.getenv("RATE_LIMIT_SHARED", "true").lower() == "true"
+            _limiters[key] = AdaptiveLimiter(
+                upstream,
+                rate=rate,
+                max_concurrency=max(1, max_concurrency // sharing_processes()),
+                latency_target=config["latency_target"],
+                bucket=SharedTokenBucket(":".join(key), rate) if shared else None,
+            )
+        return _limiters[key]
+
+
+@contextmanager
+def limited(upstream: str, api_key: str = None, level: int = None):
+    """Hold a slot of the upstream's limiter for one call and yield its ``Permit``."""
+    limiter = get_limiter(upstream, api_key)
+    if limiter is None:
+        yield Permit()
+        return
+    with limiter.slot(level) as permit:
+        yield permit
+
+
+@asynccontextmanager
+async def alimited(upstream: str, api_key: str = None, level: int = None):
+    limiter = get_limiter(upstream, api_key)
+    if limiter is None:
+        yield Permit()
+        return
+    async with limiter.aslot(level) as permit:
+        yield permit
+
+
+def llm_upstream(model: str) -> str:
+    """Upstream of a litellm model name, e.g. ``gemini`` for ``gemini/gemini-2.0-flash``."""
+    return model.split("/", 1)[0] if "/" in model else model
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or "RateLimit" in type(error).__name__
+
+
+def limiter_stats() -> dict:
+    """Concurrency limit, calls and shared bucket of every limiter this process has used."""
+    with _limiters_lock:
+        items = list(_limiters.items())
+    return {f"{upstream}:{key_id}" if key_id else upstream: limiter.stats() for (upstream, key_id), limiter in items}
@@ -1,13 +1,101 @@
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import codecs
+import contextvars
 import json
 import requests
 import os
-from unstructured.partition.html import partition_html
-from langchain_core.language_models.chat_models import BaseChatModel
-from crewai import Agent, Task, LLM
+import threading
+from typing import Optional
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
-load_dotenv()
+from tools.dedup import ChunkDeduplicator
+from events import emit, report_tool_call
+import metrics
+from metrics import traced_tool
+from tools.html_extract import streaming_extractor
+from tools.http_client import get_async_http_client, get_http_client
+from tools.rate_limit import LOW, priority
+
+SUMMARY_MODEL = "gemini/gemini-2.0-flash"
+SUMMARY_SYSTEM_PROMPT = (
+    "You're a Principal Researcher at a big company and you need to do a research about a given topic. "
+    "Do amazing researches and summaries based on the content you are working with."
+)
+SUMMARY_PROMPT = (
+    "Analyze and summarize the content below, make sure to include the most relevant "
+    "information in the summary, return only the summary nothing else."
+)
+# Bytes read from the response at a time.
+READ_SIZE = 64 * 1024
+
+DEDUP_CHUNKS = metrics.counter(
+    "tour_planner_scraper_chunks_total", "Chunks of scraped pages, by outcome: kept or dropped as a near duplicate"
+)
+
+
+class PageChunker:
+    """
+    Turn a page arriving in byte pieces into deduplicated chunks.
+
+    Every piece is decoded, fed to the HTML extractor and the completed
+    blocks to the chunk deduplicator, so only the current piece and the
+    partial chunk are held in memory. Bytes past ``max_bytes`` are ignored
+    and ``truncated`` is set so the caller can stop reading.
+    """
+
+    def __init__(self, website: str, encoding: str = None, max_bytes: int = 10_000_000):
+        self.website = website
+        self.max_bytes = max_bytes
+        self.received = 0
+        self.truncated = False
+        self._decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+        self._extractor = streaming_extractor()
+        self._deduplicator = ChunkDeduplicator()
+
+    def feed(self, data: bytes) -> list:
+        """Add a piece of the response body and return the chunks it completed."""
+        if self.truncated:
+            return []
+        if self.received + len(data) > self.max_bytes:
+            data = data[:self.max_bytes - self.received]
+            self.truncated = True
+        self.received += len(data)
+        return self._chunks(self._extractor.feed(self._decoder.decode(data)))
+
+    def close(self) -> list:
+        """Finish the page and return the remaining chunks."""
+        chunks = self._chunks(self._extractor.feed(self._decoder.decode(b"", final=True)))
+        chunks += self._chunks(self._extractor.close())
+        chunks += self._deduplicator.close()
+        stats = self._deduplicator.stats()
+        DEDUP_CHUNKS.inc(stats["chunks_after"], outcome="kept")
+        DEDUP_CHUNKS.inc(stats["chunks_dropped"], outcome="near_duplicate")
+        print(
+            f"WebScraper dedup for {self.website}: {stats['chunks_before']} -> {stats['chunks_after']} chunks, "
+            f"{stats['chunks_dropped']} near duplicates dropped, "
+            f"saved {stats['chars_saved']} chars (~{stats['tokens_saved']} tokens)"
+            + (f", page truncated at {self.max_bytes} bytes" if self.truncated else "")
+        )
+        return chunks
+
+    def _chunks(self, blocks: list) -> list:
+        return [chunk for block in blocks for chunk in self._deduplicator.add(block)]
+
+
+_summary_llms = {}
+_summary_llm_lock = threading.Lock()
+
+
+def get_summary_llm(api_key: str = None):
+    """Return the process wide LLM client that summarizes page chunks with ``api_key``, creating it on first use."""
+    with _summary_llm_lock:
+        if api_key not in _summary_llms:
+            from tools.llm_cache import CachedLLM, llm_temperature
+
+            # Pages seen before are summarized from the LLM cache instead of the model.
+            _summary_llms[api_key] = CachedLLM(model=SUMMARY_MODEL, temperature=llm_temperature(), api_key=api_key)
+        return _summary_llms[api_key]
 
 
 class WebScraperRequest(BaseModel):
@@ -19,7 +107,23 @@ class WebScraper(BaseTool):
     name: str = "Scrape website content"
     description: str = "Useful to scrape and summarize a website content"
     args_schema: type[BaseModel] = WebScraperRequest
+    max_workers: int = Field(default_factory=lambda: int(os.getenv("SCRAPER_MAX_WORKERS", 4)))
+    max_bytes: int = Field(default_factory=lambda: int(os.getenv("SCRAPER_MAX_BYTES", 10_000_000)))
+    # Browserless and summary model keys of this tool instance, read from the environment when unset.
+    api_key: Optional[str] = Field(default=None, repr=False)
+    llm_api_key: Optional[str] = Field(default=None, repr=False)
+
+    def _api_key(self) -> str:
+        return self.api_key or os.getenv("BROWSERLESS_API_KEY")
  
+    def _build_request(self, website: str) -> tuple:
+        url = f"https://chrome.browserless.io/content?token={self._api_key()}"
+        payload = json.dumps({"url": website})
+        headers = {'cache-control': 'no-cache', 'content-type': 'application/json'}
+        return url, headers, payload
+
+    @traced_tool
+    @report_tool_call
     def _run(self, website: str) -> str:
         """
         Scrape the content of a given website and summarize it.
@@ -31,40 +135,127 @@ class WebScraper(BaseTool):
             str: The summarized content of the website.
         """
         try:
-            url = f"https://chrome.browserless.io/content?token={os.getenv('BROWSERLESS_API_KEY')}"
-            payload = json.dumps({"url": website})
-            headers = {'cache-control': 'no-cache', 'content-type': 'application/json'}
-            response = requests.request("POST", url, headers=headers, data=payload)
+            url, headers, payload = self._build_request(website)
+            emit("scrape_request", website=website)
+            # The body is read in pieces below, so a huge page is never held in memory at once.
+            response = get_http_client().post(
+                url, endpoint="browserless.content", upstream="browserless", api_key=self._api_key(),
+                headers=headers, data=payload, stream=True,
+            )
             
             if response.status_code != 200:
+                response.close()
                 return f"Error: Failed to fetch website content. Status code: {response.status_code}"
             
         except requests.RequestException as e:
             return f"Error: An error occurred while making the request.to the website scraping {str(e)}"
 
-
-        elements = partition_html(text=response.text)
-        content = "\n\n".join([str(el) for el in elements])
-        content = [content[i:i + 8000] for i in range(0, len(content), 8000)]
-        summaries = []
-        
         #llm = LLM(model="groq/deepseek-r1-distill-llama-70b")
-        llm = LLM(model="gemini/gemini-2.0-flash")
-        
-        for chunk in content:
-            agent = Agent(
-                role='Principal Researcher',
-                goal='Do amazing researches and summaries based on the content you are working with',
-                backstory="You're a Principal Researcher at a big company and you need to do a research about a given topic.",
-                allow_delegation=False,
-                llm=llm
-            )
-            task = Task(
-                description=f'Analyze and summarize the content below, make sure to include the most relevant information in the summary, return only the summary nothing else.\n\nCONTENT\n----------\n{chunk}',
-                agent=agent
+        llm = get_summary_llm(self.llm_api_key)
+        chunker = PageChunker(website, response.encoding, self.max_bytes)
+
+        # Chunks are summarized as soon as they are complete, while the rest of the page is still arriving.
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as pool:
+            futures = []
+
+            def start(chunks):
+                for chunk in chunks:
+                    # Run in the caller's context so progress events and spans reach its trace.
+                    futures.append(pool.submit(contextvars.copy_context().run, self._summarize_chunk, llm, len(futures), chunk))
+
+            try:
+                for data in response.iter_content(READ_SIZE):
+                    start(chunker.feed(data))
+                    if chunker.truncated:
+                        break
+            except requests.RequestException as e:
+                print(f"WebScraper stopped reading {website} after {chunker.received} bytes: {str(e)}")
+            finally:
+                response.close()
+            start(chunker.close())
+            summaries = [future.result() for future in futures]
+        return "\n\n".join(summaries)
+
+    @traced_tool
+    @report_tool_call
+    async def _arun(self, website: str) -> str:
+        """
+        Async version of ``_run``.
+
+        The Browserless response is read in pieces on the running event loop
+        and each chunk is summarized as soon as it is complete, with at most
+        ``max_workers`` summaries in flight. Parsing and deduplicating the
+        pieces is CPU bound, so it runs in a worker thread, one piece at a time.
+        """
+        import httpx
+
+        try:
+            url, headers, payload = self._build_request(website)
+            emit("scrape_request", website=website)
+            response = await get_async_http_client().post(
+                url, endpoint="browserless.content", upstream="browserless", api_key=self._api_key(),
+                headers=headers, content=payload, stream=True,
             )
-            summary = task.execute()
-            summaries.append(summary)
+
+            if response.status_code != 200:
+                await response.aclose()
+                return f"Error: Failed to fetch website content. Status code: {response.status_code}"
+
+        except httpx.HTTPError as e:
+            return f"Error: An error occurred while making the request.to the website scraping {str(e)}"
+
+        chunker = PageChunker(website, response.charset_encoding, self.max_bytes)
+        limit = asyncio.Semaphore(max(1, self.max_workers))
+        tasks = []
+
+        async def summarize(index, chunk):
+            async with limit:
+                return await self._asummarize_chunk(index, chunk)
+
+        def start(chunks):
+            for chunk in chunks:
+                tasks.append(asyncio.ensure_future(summarize(len(tasks), chunk)))
+
+        try:
+            async for data in response.aiter_bytes(READ_SIZE):
+                start(await asyncio.to_thread(chunker.feed, data))
+                if chunker.truncated:
+                    break
+        except httpx.HTTPError as e:
+            print(f"WebScraper stopped reading {website} after {chunker.received} bytes: {str(e)}")
+        finally:
+            await response.aclose()
+        start(await asyncio.to_thread(chunker.close))
+        summaries = await asyncio.gather(*tasks)
         return "\n\n".join(summaries)
 
-        
\ No newline at end of file
+    def _summary_messages(self, chunk: str) -> list:
+        return [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": f"{SUMMARY_PROMPT}\n\nCONTENT\n----------\n{chunk}"},
+        ]
+
+    def _summarize_chunk(self, llm, index: int, chunk: str) -> str:
+        """
+        Summarize a single chunk of page content.
+
+        A failing chunk is replaced by a short note so the summaries of the
+        other chunks are still returned. Summaries are background work and
+        wait behind the agents' own LLM calls when Gemini is busy.
+        """
+        try:
+            with metrics.span("scraper", "summarize_chunk"), priority(LOW):
+                return str(llm.call(self._summary_messages(chunk)))
+        except Exception as e:
+            return f"[Summary unavailable for part {index + 1}: {str(e)}]"
+
+    async def _asummarize_chunk(self, index: int, chunk: str) -> str:
+        from tools.llm_cache import acompletion_text, llm_temperature
+
+        try:
+            with metrics.span("scraper", "summarize_chunk"), priority(LOW):
+                return await acompletion_text(
+                    SUMMARY_MODEL, self._summary_messages(chunk), temperature=llm_temperature(), api_key=self.llm_api_key
+                )
+        except Exception as e:
+            return f"[Summary unavailable for part {index + 1}: {str(e)}]"
@@ -1,64 +1,201 @@
 import json
 import requests
-from dotenv import load_dotenv
-from crewai import Agent, Task, LLM
 import os
+from typing import Optional
 from pydantic import BaseModel, Field
-from unstructured.partition.html import partition_html
 from crewai.tools import BaseTool
-load_dotenv()
+from tools.cache import DiskCache
+from events import emit, report_tool_call
+from metrics import traced_tool
+from tools.http_client import get_async_http_client, get_http_client
+
+SERPER_URL = "https://google.serper.dev/search"
+
+_search_cache = None
+
+
+def get_search_cache() -> DiskCache:
+    """Return the process wide cache of search results, creating it on first use."""
+    global _search_cache
+    if _search_cache is None:
+        _search_cache = DiskCache(
+            "web_search",
+            ttl=float(os.getenv("SEARCH_CACHE_TTL", 6 * 3600)),
+            max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 5000)),
+        )
+    return _search_cache
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
 
 class WebSearchRequest(BaseModel):
-    query: str = Field(..., description="The search query to perform on the web.")
+    query: Optional[str] = Field(None, description="The search query to perform on the web.")
+    queries: Optional[list[str]] = Field(
+        None,
+        description="Several related queries to run in a single request, e.g. flights, weather, "
+        "events and hotels for the same city",
+    )
+    num_results: Optional[int] = Field(None, description="How many results to keep for each query")
 
 
 class Web_search(BaseTool):    
-    name: str = "Scrape website content"
-    description: str = "Useful to scrape and summarize a website content"
+    name: str = "Search the internet"
+    description: str = """Useful to search the internet about a given topic and return relevant results.
+    To save round trips send related searches at once as a list of 'queries';
+    results are merged and repeated links are only shown once."""
     args_schema: type[BaseModel] = WebSearchRequest
-    def _run(self, query: str) -> str:
+    results_per_query: int = Field(default_factory=lambda: int(os.getenv("SEARCH_RESULTS_PER_QUERY", 4)))
+    # Serper key of this tool instance, SERPER_API_KEY when unset.
+    api_key: Optional[str] = Field(default=None, repr=False)
+
+    def _query_list(self, query: str = None, queries: list = None) -> list:
+        # Unique queries in the order given, so a repeated query costs nothing.
+        unique = {}
+        for item in ([query] if query else []) + list(queries or []):
+            if item and item.strip():
+                unique.setdefault(normalize_query(item), item.strip())
+        return list(unique.values())
+
+    def _cache_key(self, query: str, num: int) -> str:
+        return f"{num}:{normalize_query(query)}"
+
+    def _build_request(self, queries: list, num: int) -> tuple:
+        # Serper answers a JSON array of searches with an array of results, in order.
+        payload=[{"q": query, "num": num} for query in queries]
+        headers = {
+            "X-API-KEY": self.api_key or os.getenv('SERPER_API_KEY'),
+            "Content-Type": "application/json",
+        }
+        return headers, json.dumps(payload[0] if len(payload) == 1 else payload)
+
+    def _parse_response(self, data, queries: list, num: int) -> dict:
+        """
+        Results by query. Queries missing from a short answer get no results;
+        an answer that is not shaped like Serper's raises ``ValueError``.
+        """
+        if isinstance(data, dict) and len(queries) > 1:
+            raise ValueError(f"expected results for {len(queries)} queries, got {str(data)[:200]}")
+        responses = data if isinstance(data, list) else [data]
+        parsed = {query: [] for query in queries}
+        for query, res in zip(queries, responses):
+            if not isinstance(res, dict):
+                raise ValueError(f"unexpected search result {str(res)[:200]}")
+            results = res.get('organic') or []
+            if not isinstance(results, list):
+                continue
+            for result in results[:num]:
+                try:
+                    parsed[query].append({"title": result['title'], "link": result['link'], "snippet": result['snippet']})
+                except (KeyError, TypeError):
+                    continue
+        return parsed
+
+    def _format_results(self, results_by_query: dict) -> str:
+        seen = set()
+        sections = []
+        for query, results in results_by_query.items():
+            string = []
+            for result in results or []:
+                if result['link'] in seen:
+                    continue
+                seen.add(result['link'])
+                string.append('\n'.join([
+                    f"Title: {result['title']}", 
+                    f"url: {result['link']}",
+                    f"Snippet: {result['snippet']}", 
+                    "\n-----------------"
+                ]))
+            if not string:
+                continue
+            if len(results_by_query) > 1:
+                string.insert(0, f"Results for: {query}")
+            sections.append('\n'.join(string))
+        return '\n\n'.join(sections)
+
+    def _cached(self, queries: list, num: int) -> tuple:
+        """Return the cached results by query and the queries that still need a request."""
+        cache = get_search_cache()
+        results = {query: cache.get(self._cache_key(query, num)) for query in queries}
+        return results, [query for query, found in results.items() if found is None]
+
+    def _store(self, results: dict, fetched: dict, num: int):
+        cache = get_search_cache()
+        for query, found in fetched.items():
+            results[query] = found
+            if found:
+                cache.set(self._cache_key(query, num), found)
+
+    @traced_tool
+    @report_tool_call
+    def _run(self, query: str = None, queries: list[str] = None, num_results: int = None) -> str:
         """
-        Perform a web search using the provided query.
+        Perform a web search for one query, or a batch of queries in a single request.
         
         Args:
             query (str): The search query to perform on the web.
+            queries (list[str]): Several queries to search at once.
+            num_results (int): Results to keep per query, ``results_per_query`` by default.
         
         Returns:
-            str: The search results or an error message.
+            str: The merged search results or an error message.
         """
-      
-        try:
-            url="https://google.serper.dev/search"
-            payload={
-                "q": query,
-            }
-            headers = {
-                "X-API-KEY": os.getenv('SERPER_API_KEY'),
-                "Content-Type": "application/json",
-            }
-            response = requests.post(url, headers=headers, data=json.dumps(payload))
-
-
-            if response.status_code != 200:
-                return f"Error: Search API request failed. Status code: {response.status_code}"
-            
-            res=response.json()
-            query = "Python programming language"
-            results=res['organic'] if 'organic' in res else "No organic results found."
-            string = []
-            for result in results[:4]:
-                try:
-                    string.append('\n'.join([
-                        f"Title: {result['title']}", 
-                        f"url: {result['link']}",
-                        f"Snippet: {result['snippet']}", 
-                        "\n-----------------"
-                    ]))
-                except KeyError:
-                    continue
-            return '\n'.join(string) if string else "No valid results found"
-        except requests.RequestException as e:
-            return f"Error: An error occurred while making the request. {str(e)}"
+        queries = self._query_list(query, queries)
+        if not queries:
+            return "Error: No search query given"
+        num = num_results or self.results_per_query
+        results, missing = self._cached(queries, num)
+
+        if missing:
+            try:
+                headers, body = self._build_request(missing, num)
+                emit("search_request", queries=len(missing))
+                response = get_http_client().post(
+                    SERPER_URL, endpoint="serper.search", upstream="serper", api_key=headers["X-API-KEY"], headers=headers, data=body
+                )
+
+                if response.status_code != 200:
+                    return f"Error: Search API request failed. Status code: {response.status_code}"
+
+                self._store(results, self._parse_response(response.json(), missing, num), num)
+            except requests.RequestException as e:
+                return f"Error: An error occurred while making the request. {str(e)}"
+            except ValueError as e:
+                return f"Error: Search API returned an invalid response. {str(e)}"
+
+        output = self._format_results(results)
+        return output or "No valid results found"
+
+    @traced_tool
+    @report_tool_call
+    async def _arun(self, query: str = None, queries: list[str] = None, num_results: int = None) -> str:
+        """
+        Async version of ``_run`` that does not block the event loop on the HTTP call.
+        """
+        import httpx
+
+        queries = self._query_list(query, queries)
+        if not queries:
+            return "Error: No search query given"
+        num = num_results or self.results_per_query
+        results, missing = self._cached(queries, num)
+
+        if missing:
+            try:
+                headers, body = self._build_request(missing, num)
+                emit("search_request", queries=len(missing))
+                response = await get_async_http_client().post(
+                    SERPER_URL, endpoint="serper.search", upstream="serper", api_key=headers["X-API-KEY"], headers=headers, content=body
+                )
 
+                if response.status_code != 200:
+                    return f"Error: Search API request failed. Status code: {response.status_code}"
 
+                self._store(results, self._parse_response(response.json(), missing, num), num)
+            except httpx.HTTPError as e:
+                return f"Error: An error occurred while making the request. {str(e)}"
+            except ValueError as e:
+                return f"Error: Search API returned an invalid response. {str(e)}"
 
+        output = self._format_results(results)
+        return output or "No valid results found"
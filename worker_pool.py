@@ -0,0 +1,358 @@
+"""
+Run crews in a pool of worker processes.
+
+Every worker is a separate interpreter that preloads crewAI and the shared
+agent templates once, then runs jobs one at a time. A worker is replaced
+after ``max_jobs`` jobs, when its resident memory passes ``max_rss_mb``,
+when a job exceeds ``job_timeout`` (the process is killed) or when it
+crashes, so a runaway crew or a slow leak only ever takes down one worker.
+A worker that fails to start ``max_spawn_failures`` times in a row takes its
+slot down, and once every slot is down queued and new jobs fail right away.
+"""
+import importlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import metrics
+
+
+WORKER_JOBS = metrics.counter("tour_planner_worker_jobs_total", "Crew jobs run by pool workers, by outcome")
+WORKER_RECYCLES = metrics.counter("tour_planner_worker_recycles_total", "Pool workers replaced, by reason")
+WORKER_RSS = metrics.gauge("tour_planner_worker_rss_bytes", "Resident memory of each pool worker")
+
+
+def _resolve(path: str):
+    module, _, name = path.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def rss_bytes(pid: int = None):
+    """Resident memory of a process in bytes, or ``None`` when it cannot be read."""
+    pid = pid or os.getpid()
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _worker_main(conn, target: str, preload: str = None):
+    if preload:
+        _resolve(preload)()
+    run = _resolve(target)
+    conn.send(("ready", None, rss_bytes()))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        try:
+            reply = ("ok", run(job), rss_bytes())
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {str(e)}", rss_bytes())
+        conn.send(reply)
+
+
+class _Worker:
+    def __init__(self, context, slot: int, target: str, preload: str = None):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child, target, preload), name=f"crew-worker-{slot}", daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.jobs = 0
+        self.rss = None
+        self.started_at = time.time()
+        self.generation = 0
+
+    def stop(self, grace: float = 5.0):
+        """Ask the worker to exit after its current job, killing it if it does not."""
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(grace)
+        self.kill(grace)
+
+    def kill(self, grace: float = 5.0):
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(grace)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class CrewProcessPool:
+    """
+    Pool of worker processes with recycling, per-job timeouts and a supervisor.
+
+    One supervisor thread per worker feeds it jobs from a shared queue and
+    replaces it when needed; ``stats`` reports the memory and throughput of
+    every worker.
+
+    Args:
+        target (str): ``"module:function"`` run in the worker for every job.
+            It receives the job's inputs and its result must be picklable.
+        workers (int): Worker processes, ``CREW_PROCESSES`` or the CPU count by default.
+        preload (str): ``"module:function"`` run once when a worker starts.
+        max_jobs (int): Jobs after which a worker is replaced (``WORKER_MAX_JOBS``).
+        max_rss_mb (float): Resident memory above which a worker is replaced
+            after its current job (``WORKER_MAX_RSS_MB``).
+        job_timeout (float): Seconds after which a job fails and its worker
+            is killed (``CREW_JOB_TIMEOUT``).
+        max_spawn_failures (int): Failed starts in a row after which a slot
+            goes down (``WORKER_MAX_SPAWN_FAILURES``).
+    """
+
+    def __init__(
+        self,
+        target: str,
+        workers: int = None,
+        preload: str = None,
+        max_jobs: int = None,
+        max_rss_mb: float = None,
+        job_timeout: float = None,
+        startup_timeout: float = 120.0,
+        start_method: str = "spawn",
+        max_spawn_failures: int = None,
+    ):
+        self.target = target
+        self.preload = preload
+        self.workers = workers or int(os.getenv("CREW_PROCESSES", os.cpu_count() or 1))
+        self.max_jobs = max_jobs or int(os.getenv("WORKER_MAX_JOBS", 50))
+        self.max_rss_mb = max_rss_mb or float(os.getenv("WORKER_MAX_RSS_MB", 1500))
+        self.job_timeout = job_timeout or float(os.getenv("CREW_JOB_TIMEOUT", 900))
+        self.startup_timeout = startup_timeout
+        self.max_spawn_failures = max_spawn_failures or int(os.getenv("WORKER_MAX_SPAWN_FAILURES", 3))
+        # Forking a process that already runs threads is unsafe, so workers start from a fresh interpreter.
+        self._context = multiprocessing.get_context(start_method)
+        self._jobs = queue.Queue()
+        self._threads = []
+        self._workers = {}
+        self._slots = {}
+        self._started_at = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        # Why the last slot went down, while every slot is down.
+        self._down = None
+
+    def start(self):
+        self._started_at = time.time()
+        for slot in range(self.workers):
+            self._slots[slot] = {
+                "jobs": 0, "failed": 0, "timeouts": 0, "busy_since": None, "busy_s": 0.0, "recycles": Counter(), "down": None,
+            }
+            self._start_supervisor(slot)
+
+    def _start_supervisor(self, slot: int):
+        thread = threading.Thread(target=self._supervise, args=(slot,), name=f"crew-supervisor-{slot}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout: float = None):
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, inputs) -> Future:
+        future = Future()
+        with self._lock:
+            if self._down is not None:
+                future.set_exception(RuntimeError(self._down))
+            else:
+                self._jobs.put((future, inputs))
+        return future
+
+    def run(self, inputs, timeout: float = None):
+        """
+        Run one job in a worker and return its result, raising its error.
+
+        Waits at most ``timeout`` seconds, by default the job timeout plus the
+        time a replacement worker may take to start. A job still queued by
+        then is cancelled.
+        """
+        timeout = timeout or self.job_timeout + self.startup_timeout
+        future = self.submit(inputs)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            if future.done():
+                raise
+            future.cancel()
+            raise TimeoutError(f"Crew job did not finish within {timeout:.0f}s") from None
+
+    def recycle(self):
+        """
+        Replace every worker before its next job, e.g. after the environment
+        changed, since a worker only sees the environment it was started with.
+        Slots that went down are started again.
+        """
+        with self._lock:
+            self._generation += 1
+            self._down = None
+            down = [slot for slot, state in self._slots.items() if state["down"] is not None]
+            for slot in down:
+                self._slots[slot]["down"] = None
+                self._start_supervisor(slot)
+
+    # -- supervision ------------------------------------------------------
+
+    def _spawn(self, slot: int):
+        """Start the worker of ``slot``, or return ``None`` after ``max_spawn_failures`` failed starts."""
+        for attempt in range(1, self.max_spawn_failures + 1):
+            worker = _Worker(self._context, slot, self.target, self.preload)
+            try:
+                if worker.conn.poll(self.startup_timeout):
+                    _, _, worker.rss = worker.conn.recv()
+                    worker.generation = self._generation
+                    self._workers[slot] = worker
+                    return worker
+                print(f"Crew worker {slot} did not start within {self.startup_timeout}s")
+            except (EOFError, OSError):
+                print(f"Crew worker {slot} exited while starting with code {worker.process.exitcode}")
+            worker.kill()
+            if attempt < self.max_spawn_failures:
+                time.sleep(5)
+        return None
+
+    def _take_down(self, slot: int, future: Future = None):
+        """
+        Stop supervising ``slot`` after its worker failed to start. When it was
+        the last slot up, every queued job fails instead of waiting forever.
+        """
+        reason = f"Crew worker {slot} failed to start {self.max_spawn_failures} times in a row"
+        print(reason)
+        WORKER_RECYCLES.inc(reason="spawn_failed")
+        if future is not None:
+            future.set_exception(RuntimeError(reason))
+        with self._lock:
+            self._slots[slot]["down"] = reason
+            if any(state["down"] is None for state in self._slots.values()):
+                return
+            self._down = reason
+            while True:
+                try:
+                    item = self._jobs.get_nowait()
+                except queue.Empty:
+                    return
+                if item is not None and item[0].set_running_or_notify_cancel():
+                    item[0].set_exception(RuntimeError(reason))
+
+    def _retire(self, slot: int, reason: str, kill: bool = False):
+        worker = self._workers.pop(slot)
+        worker.kill() if kill else worker.stop()
+        self._slots[slot]["recycles"][reason] += 1
+        WORKER_RECYCLES.inc(reason=reason)
+        print(f"Crew worker {slot} (pid {worker.process.pid}) replaced after {worker.jobs} jobs: {reason}")
+
+    def _supervise(self, slot: int):
+        state = self._slots[slot]
+        while True:
+            # A replacement is started right away so the next job does not wait for the preload.
+            worker = self._workers.get(slot) or self._spawn(slot)
+            if worker is None:
+                self._take_down(slot)
+                return
+            item = self._jobs.get()
+            if item is None:
+                self._workers.pop(slot).stop()
+                return
+            future, inputs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            if worker.generation != self._generation:
+                self._retire(slot, "recycled")
+                worker = self._spawn(slot)
+                if worker is None:
+                    self._take_down(slot, future)
+                    return
+
+            state["busy_since"] = time.time()
+            try:
+                worker.conn.send(inputs)
+                if worker.conn.poll(self.job_timeout):
+                    status, payload, worker.rss = worker.conn.recv()
+                else:
+                    status, payload = "timeout", f"Crew job exceeded {self.job_timeout:.0f}s and was killed"
+            except (EOFError, OSError):
+                status, payload = "crashed", f"Crew worker exited with code {worker.process.exitcode}"
+            state["busy_s"] += time.time() - state["busy_since"]
+            state["busy_since"] = None
+            state["jobs"] += 1
+            worker.jobs += 1
+            WORKER_JOBS.inc(result=status)
+
+            if status == "ok":
+                future.set_result(payload)
+            else:
+                state["failed"] += 1
+                future.set_exception(TimeoutError(payload) if status == "timeout" else RuntimeError(payload))
+
+            if status in ("timeout", "crashed"):
+                state["timeouts"] += status == "timeout"
+                self._retire(slot, status, kill=True)
+            elif worker.jobs >= self.max_jobs:
+                self._retire(slot, "max_jobs")
+            elif worker.rss and worker.rss > self.max_rss_mb * 1024 * 1024:
+                self._retire(slot, "max_rss")
+
+    # -- reporting --------------------------------------------------------
+
+    def stats(self) -> dict:
+        """Memory and throughput of every worker, and of the pool as a whole."""
+        now = time.time()
+        uptime = now - self._started_at if self._started_at else 0.0
+        workers = []
+        for slot, state in self._slots.items():
+            worker = self._workers.get(slot)
+            rss = rss_bytes(worker.process.pid) if worker is not None and worker.process.is_alive() else None
+            if rss is not None:
+                WORKER_RSS.set(rss, worker=slot)
+            busy_s = state["busy_s"] + (now - state["busy_since"] if state["busy_since"] else 0.0)
+            workers.append({
+                "slot": slot,
+                "pid": worker.process.pid if worker is not None else None,
+                "busy": state["busy_since"] is not None,
+                "down": state["down"],
+                "rss_mb": round(rss / 1024 / 1024, 1) if rss is not None else None,
+                "jobs_since_start": worker.jobs if worker is not None else 0,
+                "worker_uptime_s": round(now - worker.started_at, 1) if worker is not None else None,
+                "jobs": state["jobs"],
+                "failed": state["failed"],
+                "timeouts": state["timeouts"],
+                "recycles": dict(state["recycles"]),
+                "jobs_per_hour": round(state["jobs"] / uptime * 3600, 2) if uptime else 0.0,
+                "utilization": round(busy_s / uptime, 3) if uptime else 0.0,
+            })
+        jobs = sum(state["jobs"] for state in self._slots.values())
+        return {
+            "workers": workers,
+            "queued": self._jobs.qsize(),
+            "jobs": jobs,
+            "jobs_per_hour": round(jobs / uptime * 3600, 2) if uptime else 0.0,
+            "max_jobs": self.max_jobs,
+            "max_rss_mb": self.max_rss_mb,
+            "job_timeout_s": self.job_timeout,
+        }